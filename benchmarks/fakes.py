@@ -0,0 +1,129 @@
+"""
+Lightweight stand-ins for the discord.py objects and cogs the filter pipeline touches, recording the API calls
+that would have been made instead of making them
+"""
+import asyncio
+import datetime
+import itertools
+from collections import Counter
+from typing import List, Optional
+
+import discord
+
+_ids = itertools.count(10 ** 17)
+
+calls: Counter = Counter()
+
+# simulated round trip of each API call, in seconds
+latency = 0.0
+
+
+async def _call(name: str):
+    calls[name] += 1
+    if latency:
+        await asyncio.sleep(latency)
+
+
+class FakeRole:
+    def __init__(self, id: int = None):
+        self.id = id or next(_ids)
+
+
+class FakeGuild:
+    def __init__(self, id: int = 586199960198971409):
+        self.id = id
+        self.name = "United Minecrafters"
+        self.emojis = []
+
+
+class FakeChannel:
+    def __init__(self, guild: FakeGuild, id: int = None, name: str = "general"):
+        self.id = id or next(_ids)
+        self.guild = guild
+        self.name = name
+        self.category = None
+
+    async def send(self, content=None, **kwargs):
+        await _call("channel.send")
+
+    async def delete_messages(self, messages):
+        calls["message.bulk_deleted"] += len(messages)
+        await _call("channel.delete_messages")
+
+
+class FakeMember:
+    def __init__(self, guild: FakeGuild, id: int = None, roles: List[FakeRole] = None, dm_open: bool = True):
+        self.id = id or next(_ids)
+        self.guild = guild
+        self.bot = False
+        self.name = f"user{self.id % 10000}"
+        self.display_name = self.name
+        self.mention = f"<@!{self.id}>"
+        self.roles = [FakeRole(guild.id)] + (roles or [])
+        self.dm_open = dm_open
+
+    def __str__(self):
+        return f"{self.name}#0001"
+
+    async def send(self, content=None, **kwargs):
+        await _call("member.send")
+        if not self.dm_open:
+            raise discord.Forbidden(_FakeResponse(403), "Cannot send messages to this user")
+
+
+class FakeMessage:
+    def __init__(self, author: FakeMember, channel: FakeChannel, content: str):
+        self.id = next(_ids)
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.created_at = datetime.datetime.utcnow()
+        self.attachments = []
+        self.embeds = []
+        self.mentions = []
+        self.role_mentions = []
+        self.mention_everyone = False
+        self.jump_url = f"https://discord.com/channels/{self.guild.id}/{channel.id}/{self.id}"
+
+    async def delete(self):
+        await _call("message.delete")
+
+
+class _FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+        self.reason = "Forbidden"
+
+
+class FakeModLog:
+    async def log_filter(self, flt: str, author, channel: str, content: str):
+        calls[f"rule.{flt.split(':')[0]}"] += 1
+        await _call("modlog.log_filter")
+
+    async def log_message(self, title: str, message: str, author=None, emoji: str = None):
+        await _call("modlog.log_message")
+
+
+class FakeModeration:
+    def __init__(self):
+        self.mutes = set()
+
+    async def bot_mute(self, user: FakeMember, rule: str, seconds: int):
+        if user.id in self.mutes:
+            return False
+        calls["moderation.bot_mute"] += 1
+        self.mutes.add(user.id)
+        return True
+
+
+class FakeBot:
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.cogs = {"ModLog": FakeModLog(), "Moderation": FakeModeration()}
+
+    async def wait_until_ready(self):
+        return
+
+    def get_cog(self, name: str) -> Optional[object]:
+        return self.cogs.get(name)
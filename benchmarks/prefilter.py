@@ -0,0 +1,49 @@
+"""
+Measures the miss-path cost of the word/token filters with and without the literal prefilter
+
+    python -m benchmarks.prefilter [--config config-default.yaml] [--messages 5000]
+"""
+import argparse
+import random
+import timeit
+
+from ruamel.yaml import YAML
+
+from libs.filters import FilterEngine
+
+WORDS = "the a to and is it you i that of in for on this minecraft server join play build world craft " \
+        "redstone nether mod pack java bedrock whitelist lol ok yeah thanks anyone online today tonight " \
+        "house farm base diamond creeper villager trade update version ip".split()
+
+
+def corpus(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 40))) for _ in range(n)]
+
+
+def per_message_us(engine: FilterEngine, messages, repeat: int) -> float:
+    best = min(timeit.repeat(lambda: [engine.check(m) for m in messages], number=1, repeat=repeat))
+    return best / len(messages) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--config", default="config-default.yaml")
+    ap.add_argument("--messages", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    with open(args.config) as fp:
+        filters = YAML(typ="safe").load(fp)["filters"]
+    plain = FilterEngine(filters, prefilter=False)
+    messages = [m for m in corpus(args.messages) if not plain.check(m)]
+
+    without = per_message_us(plain, messages, args.repeat)
+    with_pf = per_message_us(FilterEngine(filters), messages, args.repeat)
+    print(f"{len(messages)} clean messages, avg {sum(map(len, messages)) / len(messages):.0f} chars")
+    print(f"without prefilter: {without:8.2f} us/message")
+    print(f"with prefilter:    {with_pf:8.2f} us/message ({without / with_pf:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
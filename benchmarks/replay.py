@@ -0,0 +1,150 @@
+"""
+Replays a message corpus through Filter.on_message without connecting to Discord, reporting latency, throughput
+and the API calls the filter would have made, for several blacklist sizes
+
+    python -m benchmarks.replay [--config config-default.yaml] [--corpus messages.jsonl] [--sizes 0,1000,10000]
+                                [--latency 50]
+
+A corpus is JSON lines of {"author": int, "channel": int, "content": str}. Without one, a synthetic corpus is used.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import time
+from typing import Dict, List, Tuple
+
+WORDS = "the a to and is it you i that of in for on this minecraft server join play build world craft " \
+        "redstone nether mod pack java bedrock whitelist lol ok yeah thanks anyone online today tonight " \
+        "house farm base diamond creeper villager trade update version ip".split()
+BAD_WORDS = ["fag", "kys", "bitch", "retard", "cuck"]
+BAD_LINKS = ["https://grabify.link/abc", "free nitro discord.gift/xyz", "https://www.pornhub.com/view"]
+
+
+def synthetic_corpus(n: int, seed: int = 0) -> List[Tuple[int, int, str]]:
+    rnd = random.Random(seed)
+    members = max(1, n // 2)
+    msgs = []
+    while len(msgs) < n:
+        author, channel = rnd.randrange(members), rnd.randrange(20)
+        text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 40)))
+        roll = rnd.random()
+        if roll < 0.04:
+            text += " " + rnd.choice(BAD_WORDS)
+        elif roll < 0.07:
+            text += " " + rnd.choice(BAD_LINKS)
+        elif roll < 0.08:
+            msgs.extend((author, channel, text) for _ in range(10))
+            continue
+        msgs.append((author, channel, text))
+    return msgs[:n]
+
+
+def load_corpus(path: str) -> List[Tuple[int, int, str]]:
+    with open(path, encoding="utf-8") as fp:
+        return [(int(m["author"]), int(m["channel"]), m["content"]) for m in map(json.loads, fp) if m]
+
+
+def pad_rules(filters: Dict, size: int, seed: int = 1):
+    """
+    Grows the word and domain blacklists to `size` entries each with random rules that never match the corpus
+    """
+    rnd = random.Random(seed)
+    words, domains = filters["word_blacklist"], filters["domain_blacklist"]
+    while len(words) < size:
+        words.append("".join(rnd.choice("qxzjv") + rnd.choice(string.ascii_lowercase) for _ in range(3)) + "+s*")
+    while len(domains) < size:
+        domains.append("".join(rnd.choice(string.ascii_lowercase) for _ in range(10)) + ".xyz")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def replay(corpus: List[Tuple[int, int, str]], size: int) -> Dict:
+    from benchmarks import fakes
+    from cogs.administration.filters import Filter
+    from libs import metrics
+    from libs.config import config, store
+    from libs.outbound import outbound
+
+    filters = config()["filters"]
+    saved_words, saved_domains = store.list("word_blacklist"), list(filters["domain_blacklist"])
+    padded = {"word_blacklist": list(saved_words), "domain_blacklist": filters["domain_blacklist"]}
+    pad_rules(padded, size)
+    store.replace("word_blacklist", padded["word_blacklist"])
+    fakes.calls.clear()
+    metrics.reset()
+    bot = fakes.FakeBot()
+    cog = Filter(bot)
+    try:
+        await asyncio.sleep(0)  # let the cog's _init pick up the fake ModLog/Moderation
+        guild = fakes.FakeGuild()
+        channels: Dict[int, fakes.FakeChannel] = {}
+        members: Dict[int, fakes.FakeMember] = {}
+        latencies = []
+        start = time.perf_counter()
+        for author, channel, content in corpus:
+            if author not in members:
+                members[author] = fakes.FakeMember(guild, dm_open=author % 5 != 0)
+            if channel not in channels:
+                channels[channel] = fakes.FakeChannel(guild)
+            msg = fakes.FakeMessage(members[author], channels[channel], content)
+            t = time.perf_counter()
+            await cog.on_message(msg)
+            latencies.append(time.perf_counter() - t)
+        await cog.enforcement.join()
+        await cog.notifications.join()
+        while not outbound.idle:
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - start
+    finally:
+        cog.cog_unload()
+        store.replace("word_blacklist", saved_words)
+        filters["domain_blacklist"][:] = saved_domains
+    latencies.sort()
+    ttd = metrics.histograms.get("enforcement.time_to_delete", metrics.Histogram())
+    return {
+        "size": size,
+        "p50": percentile(latencies, 0.50) * 1e6,
+        "p99": percentile(latencies, 0.99) * 1e6,
+        "rate": len(corpus) / elapsed,
+        "ttd": ttd.percentile(0.99) * 1e3,
+        "calls": dict(fakes.calls, **{"modlog.log_filter": metrics.counters["journal.filter"]}),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--config", default="config-default.yaml")
+    ap.add_argument("--corpus", help="JSONL export of messages")
+    ap.add_argument("--messages", type=int, default=10000, help="size of the synthetic corpus")
+    ap.add_argument("--sizes", default="0,100,1000,10000", help="blacklist sizes to test, comma separated")
+    ap.add_argument("--latency", type=float, default=0, help="simulated API round trip, in milliseconds")
+    args = ap.parse_args()
+    os.environ["KAEDE_CONFIG"] = args.config
+    os.environ.setdefault("KAEDE_STORE", ":memory:")
+    os.environ.setdefault("KAEDE_JOURNAL", ":memory:")
+    from benchmarks import fakes
+    fakes.latency = args.latency / 1000
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.messages)
+    print(f"{len(corpus)} messages")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    print(f"{'rules':>7} {'p50 us':>9} {'p99 us':>9} {'msg/s':>9} {'ttd p99 ms':>10}  "
+          f"deletes  DMs  channel  modlog  mutes")
+    for size in map(int, args.sizes.split(",")):
+        r = loop.run_until_complete(replay(corpus, size))
+        c = r["calls"]
+        print(f"{r['size']:>7} {r['p50']:>9.1f} {r['p99']:>9.1f} {r['rate']:>9.0f} {r['ttd']:>10.1f}  "
+              f"{c.get('message.delete', 0) + c.get('message.bulk_deleted', 0):>7} "
+              f"{c.get('member.send', 0):>4} {c.get('channel.send', 0):>8} "
+              f"{c.get('modlog.log_filter', 0) + c.get('modlog.log_message', 0):>7} "
+              f"{c.get('moderation.bot_mute', 0):>6}")
+
+
+if __name__ == '__main__':
+    main()
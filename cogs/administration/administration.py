@@ -1,9 +1,12 @@
 import ast
+import logging
 
 import discord
 from discord.ext import commands
 
-from libs.config import config
+from libs.utils import has_staff_role
+
+log = logging.getLogger("kaede.admin")
 
 
 class Administration(commands.Cog):
@@ -16,7 +19,7 @@ class Administration(commands.Cog):
         changes the color of your custom staff role
         #STAFF
         """
-        if config()["roles"]["staff"] not in [r.id for r in ctx.author.roles]:
+        if not has_staff_role(ctx.author):
             await ctx.send("Um. *no you can't do that*")
             return
         m: discord.Member = ctx.author
@@ -25,7 +28,7 @@ class Administration(commands.Cog):
 
     @color.error
     async def color_err(self, ctx, error2):
-        print(error2)
+        log.info(f"color failed for {ctx.author}: {error2}")
         await ctx.send("heh...*nope*")
 
     @commands.command()
@@ -34,7 +37,7 @@ class Administration(commands.Cog):
         changes the name of your custom staff role
         #STAFF
         """
-        if config()["roles"]["staff"] not in [r.id for r in ctx.author.roles]:
+        if not has_staff_role(ctx.author):
             await ctx.send("Um. *no you can't do that*")
             return
         if len(role) > 32:
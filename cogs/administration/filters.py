@@ -1,6 +1,9 @@
+import asyncio
 import logging
 import re
-from typing import Dict, Optional, Tuple
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
 
 import discord
 from discord.ext import commands
@@ -8,10 +11,42 @@ from disputils import BotConfirmation, BotEmbedPaginator
 
 import cogs.administration.moderation
 import cogs.administration.modlog
-from libs.config import config, save_config
-from libs.utils import numbered, pages, quote
+from libs import metrics, startup
+from libs.analysis import MessageAnalysis, analyze
+from libs.config import config, emojis, filters_config, settings, store
+from libs.duplicates import DuplicateDetector
+from libs.enforcement import WorkQueue
+from libs.filters import FilterEngine, VerdictCache, regex_complexity
+from libs.journal import Kind, event, journal
+from libs.normalize import skeleton
+from libs.outbound import Priority, outbound
+from libs.ratelimit import RateEngine
+from libs.sandbox import RegexSandbox
+from libs.suppression import suppressions
+from libs.utils import has_config_role, numbered, pages, quote
 
-url_regex = re.compile(r"(https?://[^\s]+)")
+log = logging.getLogger("kaede.filter")
+
+emoji_regex = re.compile(r"<a?:\w+:\d+>|[\u2600-\u27bf\U0001f000-\U0001faff]")
+
+
+def embed_text(embed: discord.Embed) -> str:
+    """
+    :return: the text of an embed that could carry filtered words or links
+    """
+    parts = [embed.title, embed.description, embed.url, embed.author.name, embed.footer.text]
+    parts += [p for f in embed.fields for p in (f.name, f.value)]
+    return "\n".join(str(p) for p in parts if p)
+
+
+@dataclass
+class FilterHit:
+    message: discord.Message
+    rule: str
+    reason: str
+    received: float
+    detail: Optional[str] = None  # what tripped the rule, for rules that don't say by their name
+    deleted: Optional[asyncio.Future] = None
 
 
 class Filter(commands.Cog):
@@ -20,60 +55,118 @@ class Filter(commands.Cog):
         self.modlog: Optional[cogs.administration.modlog.ModLog] = None
         self.moderation: Optional[cogs.administration.moderation.Moderation] = None
         bot.loop.create_task(self._init())
-        self._cooldowns: Dict[str, commands.CooldownMapping] = {}
-        self._cd_vals: Dict[str, Tuple[float, float]] = {}
-        for rule in ["burst"]:
-            self._cooldowns[rule] = commands.CooldownMapping.from_cooldown(
-                float(config()["automod"][rule]["number"]),
-                float(config()["automod"][rule]["interval"]),
-                commands.BucketType.member
-            )
-            self._cd_vals[rule] = (float(config()["automod"][rule]["number"]),
-                                   float(config()["automod"][rule]["number"]))
+        self.engine = FilterEngine(filters_config())
+        self.compiled_lists = self._list_versions()
+        self.sandbox = RegexSandbox(self.engine,
+                                    workers=int(config()["filters"]["sandbox"]["workers"]),
+                                    budget=float(config()["filters"]["sandbox"]["budget"]),
+                                    on_quarantine=self._on_quarantine)
+        self.rates = RateEngine(config()["automod"])
+        self.duplicates = self._make_duplicate_detector()
+        self.verdicts = VerdictCache(int(config()["filters"]["verdict_cache"]))
+        # two stages, so slow DMs and logging never hold up the deletes queued behind them
+        enforcement = config()["filters"]["enforcement"]
+        self.enforcement = WorkQueue("enforcement", self._enforce, loop=bot.loop,
+                                     workers=int(enforcement["workers"]), maxsize=int(enforcement["queue"]))
+        self.notifications = WorkQueue("notifications", self._notify, loop=bot.loop,
+                                       workers=int(enforcement["workers"]), maxsize=int(enforcement["queue"]))
 
+    @startup.init("ModLog", "Moderation")
     async def _init(self):
-        logging.info("[FILTER] Waiting for bot")
-        await self.bot.wait_until_ready()
         self.modlog = self.bot.get_cog("ModLog")
         self.moderation = self.bot.get_cog("Moderation")
-        logging.info("[FILTER] Ready")
+        log.info("Ready")
+
+    def cog_unload(self):
+        self.sandbox.close()
+        self.enforcement.close()
+        self.notifications.close()
+
+    async def _on_quarantine(self, rule_class: str, pattern: str):
+        await self.modlog.log_message("Filter Rule Quarantined",
+                                      f"```{pattern}```Rule from `{rule_class}` took longer than "
+                                      f"{self.sandbox.budget}s to evaluate and was disabled. Delete or fix it.",
+                                      emoji=emojis.filter)
+
+    @staticmethod
+    def _list_versions() -> Tuple[int, int]:
+        return store.version("word_blacklist"), store.version("token_blacklist")
+
+    def reconfigure(self, changed: FrozenSet[str] = frozenset()):
+        """
+        Rebuilds what depends on the parts of the config that changed, and the matchers if the blacklists in the
+        store changed since they were compiled
+
+        :param changed: the changed config paths, see :func:`libs.config.diff`
+        """
+        if changed & {f"filters.{k}" for k in FilterEngine.INPUTS} or self._list_versions() != self.compiled_lists:
+            self.compiled_lists = self._list_versions()
+            self.engine.compile(filters_config())
+        if changed & {"automod.rules", "automod.punishment"}:
+            self.rates.load(config()["automod"])
+        if "automod.duplicates" in changed:
+            self.duplicates = self._make_duplicate_detector()
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed: FrozenSet[str]):
+        self.reconfigure(changed)
+
+    @staticmethod
+    def _make_duplicate_detector() -> DuplicateDetector:
+        dup = config()["automod"]["duplicates"]
+        return DuplicateDetector(threshold=float(dup["threshold"]), window=float(dup["window"]),
+                                 min_length=int(dup["min_length"]))
+
+    def _metrics(self, msg: MessageAnalysis) -> Dict[str, int]:
+        metrics = {"messages": 1}
+        wanted = self.rates.metrics
+        if "mentions" in wanted:
+            metrics["mentions"] = msg.mentions
+        if "links" in wanted:
+            metrics["links"] = len(msg.links)
+        if "newlines" in wanted:
+            metrics["newlines"] = msg.content.count("\n")
+        if "attachments" in wanted:
+            metrics["attachments"] = len(msg.message.attachments)
+        if "emoji" in wanted:
+            metrics["emoji"] = len(emoji_regex.findall(msg.content))
+        return metrics
 
     @commands.command(aliases=["lfw"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def listfilteredwords(self, ctx: commands.Context):
         """
         Lists the filtered words
         #STAFF
         """
-        await BotEmbedPaginator(ctx, pages(numbered(config()["filters"]["word_blacklist"]), 10, "Filtered Words")).run()
+        await BotEmbedPaginator(ctx, pages(numbered(store.list("word_blacklist")), 10, "Filtered Words")).run()
 
     @commands.command(aliases=["lft"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def listfilteredtoken(self, ctx: commands.Context):
         """
         Lists filtered tokens
         #STAFF
         """
         await BotEmbedPaginator(ctx,
-                                pages(numbered(config()["filters"]["token_blacklist"]), 10, "Filtered Tokens")).run()
+                                pages(numbered(store.list("token_blacklist")), 10, "Filtered Tokens")).run()
 
     @commands.command(aliases=["dfw"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def delfilteredword(self, ctx: commands.Context, n: int):
         """
         Delete a filtered word
         #STAFF
         """
-        if n < 0 or n >= len(config()["filters"]["word_blacklist"]):
-            await ctx.send("Invalid number - do `!lfw` to view")
+        if n < 0 or n >= len(store.list("word_blacklist")):
+            return await ctx.send("Invalid number - do `!lfw` to view")
         conf = BotConfirmation(ctx, 0x5555ff)
-        await conf.confirm(f'Delete `{config()["filters"]["word_blacklist"][n]}`?')
+        await conf.confirm(f'Delete `{store.list("word_blacklist")[n]}`?')
 
         if conf.confirmed:
             try:
-                s = config()["filters"]["word_blacklist"][n]
-                del config()["filters"]["word_blacklist"][n]
-                save_config()
+                s = store.pop("word_blacklist", n)
+                self.reconfigure()
             except Exception as e:  # noqa e722
                 await conf.update("An error occurred", color=0xffff00)
             else:
@@ -83,22 +176,21 @@ class Filter(commands.Cog):
             await conf.update("Canceled", color=0xff5555)
 
     @commands.command(aliases=["dft"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def delfilteredtoken(self, ctx: commands.Context, n: int):
         """
         Delete a filtered token
         #STAFF
         """
-        if n < 0 or n >= len(config()["filters"]["token_blacklist"]):
-            await ctx.send("Invalid number - do `!lfw` to view")
+        if n < 0 or n >= len(store.list("token_blacklist")):
+            return await ctx.send("Invalid number - do `!lft` to view")
         conf = BotConfirmation(ctx, 0x5555ff)
-        await conf.confirm(f'Delete `{config()["filters"]["token_blacklist"][n]}`?')
+        await conf.confirm(f'Delete `{store.list("token_blacklist")[n]}`?')
 
         if conf.confirmed:
             try:
-                s = config()["filters"]["token_blacklist"][n]
-                del config()["filters"]["token_blacklist"][n]
-                save_config()
+                s = store.pop("token_blacklist", n)
+                self.reconfigure()
             except Exception as e:  # noqa e722
                 await conf.update("An error occurred", color=0xffff00)
             else:
@@ -108,20 +200,24 @@ class Filter(commands.Cog):
             await conf.update("Canceled", color=0xff5555)
 
     @commands.command(aliases=["ft", "aft"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def addfilteredtoken(self, ctx: commands.Context, *, w: str):
         """
         Add a filtered token
         #STAFF
         """
         w = w.strip("` ")
+        reason = regex_complexity(w)
+        if reason:
+            await ctx.send(f"Can't add `{w}` ({reason})")
+            return
         conf = BotConfirmation(ctx, 0x5555ff)
         await conf.confirm(f'Add `{w}`?')
 
         if conf.confirmed:
             try:
-                config()["filters"]["token_blacklist"].append(w)
-                save_config()
+                store.append("token_blacklist", w)
+                self.reconfigure()
             except Exception as e:  # noqa e722
                 await conf.update("An error occurred", color=0xffff00)
             else:
@@ -131,20 +227,24 @@ class Filter(commands.Cog):
             await conf.update("Canceled", color=0xff5555)
 
     @commands.command(aliases=["fw", "afw"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def addfilteredword(self, ctx: commands.Context, *, w: str):
         """
         Add a filtered word
         #STAFF
         """
         w = w.strip("` ")
+        reason = regex_complexity(w)
+        if reason:
+            await ctx.send(f"Can't add `{w}` ({reason})")
+            return
         conf = BotConfirmation(ctx, 0x5555ff)
         await conf.confirm(f'Add `{w}`?')
 
         if conf.confirmed:
             try:
-                config()["filters"]["word_blacklist"].append(w)
-                save_config()
+                store.append("word_blacklist", w)
+                self.reconfigure()
             except Exception as e:  # noqa e722
                 await conf.update("An error occurred", color=0xffff00)
             else:
@@ -155,8 +255,16 @@ class Filter(commands.Cog):
 
     @commands.Cog.listener()
     async def on_message_edit(self, before: discord.Message, after: discord.Message):
-        if before.content != after.content:
-            await self.on_message(after)
+        if after.author.bot or not after.guild or self._exempt(after):
+            return
+        received = time.perf_counter()
+        # unchanged content and embeds are verdict cache hits, so only the edited text is scanned
+        msg = analyze(after)
+        hit = await self._scan(msg.content, msg)
+        for embed in after.embeds:
+            hit = hit or await self._scan(embed_text(embed))
+        if hit:
+            await self._filter_hit(after, hit[0], hit[1], received)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):  # noqa: c901
@@ -164,58 +272,103 @@ class Filter(commands.Cog):
             return
         if not message.guild:
             return
-        f = config()["filters"]
-        content = message.content.lower()
-
-        for r in f["role_whitelist"]:
-            if r in [a.id for a in message.author.roles[1:]]:
-                return
-
-        if self._cooldowns["burst"].get_bucket(message).update_rate_limit():
-            dur = int(config()["automod"]["punishment"]["duration"])
-            if message.author.id not in self.moderation.active_mutes:  # prevent race condition
-                await self.moderation.bot_mute(message.author, "burst", dur)
-                await message.channel.send(f"🤫 {message.author} muted for {dur}s (burst)")
+        received = time.perf_counter()
+        if self._exempt(message):
+            return
+        msg = analyze(message)
+
+        rule = self.rates.hit(message.author.id, message.channel.id, self._metrics(msg))
+        if rule:
+            if message.author.id not in self.moderation.mutes:  # prevent race condition
+                await self.moderation.bot_mute(message.author, rule.name, rule.duration)
+                outbound.send(message.channel, f"🤫 {message.author} muted for {rule.duration}s ({rule.name})",
+                              priority=Priority.LOGGING, cog=self.qualified_name)
+            return
+
+        hit = await self._scan(msg.content, msg)
+        if hit:
+            await self._filter_hit(message, hit[0], hit[1], received)
             return
 
-        for r in f["word_blacklist"]:
-            if re.search(rf"(?:-|\b){r}(?:-|\b)", content):
-                try:
-                    await message.author.send(f"Hey, {message.author.mention}, your message was removed because of a "
-                                              f"blacklisted word. If you feel this was a mistake, let staff know.")
-                    await message.author.send(quote(message.content))
-                except discord.Forbidden:
-                    await message.channel.send(f"Hey, {message.author.mention}, your message was removed because of a "
-                                               f"blacklisted word. If you feel this was a mistake, let staff know.")
-                await self.modlog.log_filter("word_blacklist", message)
-                await message.delete()
-                return
-
-        for r in f["token_blacklist"]:
-            if re.search(fr"{r}", content):
-                try:
-                    await message.author.send(f"Hey, {message.author.mention}, your message was removed because of a "
-                                              f"blacklisted word. If you feel this was a mistake, let staff know.")
-                    await message.author.send(quote(message.content))
-                except discord.Forbidden:
-                    await message.channel.send(f"Hey, {message.author.mention}, your message was removed because of a "
-                                               f"blacklisted word. If you feel this was a mistake, let staff know.")
-                await self.modlog.log_filter("word_blacklist", message)
-                await message.delete()
-                return
-
-        for url in f["domain_blacklist"]:
-            if url in content:
-                try:
-                    await message.author.send(f"Hey, {message.author.mention}, your message was removed because of a "
-                                              f"blacklisted domain. If you feel this was a mistake, let staff know.")
-                    await message.author.send(quote(message.content))
-                except discord.Forbidden:
-                    await message.channel.send(f"Hey, {message.author.mention}, your message was removed because of a "
-                                               f"blacklisted domain. If you feel this was a mistake, let staff know.")
-                await self.modlog.log_filter("domain_blacklist", message)
-                await message.delete()
-                return
+        dup = settings().duplicates
+        verdict = self.duplicates.check(message.author.id, message.channel.id, msg.skeleton)
+        if verdict.member_matches >= dup["member"] and verdict.member_channels > 1:
+            await self._filter_hit(message, "duplicates", "spam", received,
+                                   f"{verdict.member_matches} copies in {verdict.member_channels} channels")
+            if message.author.id not in self.moderation.mutes:
+                await self.moderation.bot_mute(message.author, "duplicates", int(dup["duration"]))
+            return
+        if verdict.guild_matches >= dup["guild"]:
+            await self._filter_hit(message, "duplicates", "spam", received,
+                                   f"{verdict.guild_matches} copies from {verdict.guild_members} members")
+            return
+
+    @staticmethod
+    def _exempt(message: discord.Message) -> bool:
+        whitelist = settings().role_whitelist
+        return any(r.id in whitelist for r in message.author.roles[1:])
+
+    async def _scan(self, text: str, msg: MessageAnalysis = None) -> Optional[Tuple[str, str]]:
+        """
+        Checks text against the word, token and domain blacklists, through the verdict cache
+
+        :param text: the text to check
+        :param msg: the analysis the text is the content of, to share its skeleton
+        :return: the rule that fired and the reason given to the author, or None
+        """
+        if not text:
+            return None
+        key, version = self.verdicts.key(text), self.engine.version
+        verdict = self.verdicts.get(key, version)
+        if verdict is not VerdictCache.MISS:
+            return verdict
+        timeouts = self.sandbox.timeouts
+        # rules with digits in them are also run against the text folded without leetspeak
+        plain = skeleton(text) if self.engine.plain_rules else None
+        hit = await self.sandbox.check(msg.skeleton if msg is not None else skeleton(text, leet=True), plain)
+        if hit:
+            verdict = f"{hit[0]}: {hit[1]}", "a blacklisted word"
+        else:
+            domain = self.engine.check_domains(text)
+            verdict = (f"domain_blacklist: {domain}", "a blacklisted domain") if domain else None
+        if self.sandbox.timeouts == timeouts:  # a scan that ran out of time isn't a verdict
+            self.verdicts.put(key, version, verdict)
+        return verdict
+
+    async def _filter_hit(self, message: discord.Message, flt: str, reason: str, received: float,
+                          detail: str = None):
+        await self.enforcement.put(FilterHit(message, flt, reason, received, detail))
+
+    async def _enforce(self, hit: FilterHit):
+        # the delete goes out ahead of everything else, the author is notified and the hit logged once it's done
+        metrics.observe("enforcement.queue_wait", time.perf_counter() - hit.received)
+        suppressions.add("delete", hit.message.id)
+        hit.deleted = outbound.delete(hit.message, priority=Priority.MODERATION, cog=self.qualified_name)
+        hit.deleted.add_done_callback(
+            lambda _: metrics.observe("enforcement.time_to_delete", time.perf_counter() - hit.received))
+        await self.notifications.put(hit)
+
+    async def _notify(self, hit: FilterHit):
+        # a failed delete is still journaled and the author still told, whatever the delete raised
+        await asyncio.wait([hit.deleted])
+        message = hit.message
+        error = None if hit.deleted.cancelled() else hit.deleted.exception()
+        deleted = not hit.deleted.cancelled() and (error is None or isinstance(error, discord.NotFound))
+        if not deleted:
+            log.warning(f"Couldn't delete filtered message {message.id} - {error or 'cancelled'}")
+        journal.append(event(Kind.FILTER, message.author, reason=hit.detail, rule=hit.rule,
+                             channel=message.channel.name, content=message.content, deleted=deleted))
+        await self._notify_author(message, hit.reason)
+
+    async def _notify_author(self, message: discord.Message, reason: str):
+        notice = f"Hey, {message.author.mention}, your message was removed because of {reason}. If you feel this " \
+                 f"was a mistake, let staff know."
+        try:
+            await outbound.send(message.author, notice, priority=Priority.LOGGING, cog=self.qualified_name)
+            await outbound.send(message.author, quote(message.content), priority=Priority.LOGGING,
+                                cog=self.qualified_name)
+        except discord.Forbidden:
+            await outbound.send(message.channel, notice, priority=Priority.LOGGING, cog=self.qualified_name)
 
 
 def setup(bot: commands.Bot) -> None:
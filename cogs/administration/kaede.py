@@ -1,17 +1,19 @@
 import logging
-import sys
-import traceback
 from itertools import cycle
-from typing import Optional
+from typing import FrozenSet, Optional
 
 import discord
 from discord.ext import commands, tasks
 from disputils import BotConfirmation, BotEmbedPaginator
 
 from cogs.administration.modlog import ModLog
-from libs.config import config, reload_config, save_config
+from libs import metrics, startup
+from libs.config import config, modified, reload_config, settings, store
+from libs.outbound import Priority, outbound
 from libs.utils import numbered, pages
 
+log = logging.getLogger("kaede.core")
+
 
 class Kaede(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -50,19 +52,60 @@ class Kaede(commands.Cog):
             await ctx.send(f"An error occured while executing the command\n{error}")
 
         else:
-            # All other Errors not returned come here. And we can just print the default TraceBack.
-            print('Ignoring exception in command {}:'.format(ctx.command), file=sys.stderr)
-            traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+            # All other Errors not returned come here. And we can just log the default TraceBack.
+            log.error(f"Ignoring exception in command {ctx.command}",
+                      exc_info=(type(error), error, error.__traceback__))
 
+    @startup.init("ModLog")
     async def _init(self):
-        logging.info("[KAEDE] Waiting for bot")
-        await self.bot.wait_until_ready()
-        self.status = cycle(config()["statuses"])
+        self.status = cycle(settings().statuses)
         self.status_rotate.start()
         self.modlog = self.bot.get_cog("ModLog")
         await self.bot.change_presence(status=discord.Status.do_not_disturb,
                                        activity=discord.Game(name=self.status.__next__()))
-        logging.info("[KAEDE] Ready")
+        self._watch()
+        log.info("Ready")
+
+    def cog_unload(self):
+        self.status_rotate.cancel()
+        self.watch_config.cancel()
+
+    def reload(self) -> FrozenSet[str]:
+        """
+        Reloads the config and lets every cog rebuild what depends on the parts that changed
+
+        :return: the changed config paths, see :func:`libs.config.diff`
+        """
+        changed = reload_config()
+        if changed:
+            log.info(f"Config reloaded, changed {', '.join(sorted(c for c in changed if '.' not in c))}")
+            self.bot.dispatch("config_reload", changed)
+        return changed
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed: FrozenSet[str]):
+        if "status_cycle" in changed:
+            self.status_rotate.change_interval(seconds=settings().status_cycle)
+            self.status_rotate.restart()
+        if "config_watch" in changed:
+            self._watch()
+
+    def _watch(self):
+        interval = settings().config_watch
+        if interval <= 0:
+            self.watch_config.cancel()
+            return
+        self.watch_config.change_interval(seconds=interval)
+        if not self.watch_config.is_running():
+            self.watch_config.start()
+
+    @tasks.loop(seconds=5)
+    async def watch_config(self):
+        if modified():
+            try:
+                self.reload()
+            except Exception as e:  # noqa e722
+                log.error(f"Can't reload the changed config: {e!r}")
 
     @tasks.loop(seconds=config()["status_cycle"])
     async def status_rotate(self):
@@ -76,11 +119,9 @@ class Kaede(commands.Cog):
 
     @commands.Cog.listener()
     async def on_command_completion(self, ctx: commands.Context):
-        if ctx.channel.id not in config()["delete_exceptions"]:
-            try:
-                await ctx.message.delete()
-            except discord.NotFound:
-                pass
+        if ctx.channel.id not in settings().delete_exceptions:
+            # queued behind moderation and logging, and coalesced into bulk deletes when commands pile up
+            outbound.delete(ctx.message, priority=Priority.COSMETIC, cog=self.qualified_name)
 
     @commands.command()
     @commands.is_owner()
@@ -101,15 +142,14 @@ class Kaede(commands.Cog):
         """
         await ctx.send("Reloading config...")
         try:
-            reload_config()
-            self.status = cycle(config()["statuses"])
-            self.status_rotate.change_interval(seconds=config()["status_cycle"])
-            self.status_rotate.restart()
+            changed = self.reload()
         except Exception as e:  # noqa e722
             await ctx.send("An error occ ured")
             raise e
         else:
-            await ctx.send("Config reloaded! :D")
+            sections = sorted(c for c in changed if "." not in c)
+            await ctx.send(f"Config reloaded! :D Changed: {', '.join(sections)}" if sections
+                           else "Config reloaded, nothing changed")
 
     @commands.command(aliases=["lsst"])
     @commands.is_owner()
@@ -118,7 +158,7 @@ class Kaede(commands.Cog):
         Lists kaede's statuses
         #OWNER
         """
-        await BotEmbedPaginator(ctx, pages(numbered(config()["statuses"]), 10, "Statuses")).run()
+        await BotEmbedPaginator(ctx, pages(numbered(settings().statuses), 10, "Statuses")).run()
 
     @commands.command(aliases=["dlst"])
     @commands.is_owner()
@@ -127,21 +167,19 @@ class Kaede(commands.Cog):
         Deletes a status
         #OWNER
         """
-        if len(config()["statuses"]) == 1:
+        if len(settings().statuses) == 1:
             await ctx.send("Can't delete only status, do `!resetstatus`")
             return
-        if n < 0 or n >= len(config()["statuses"]):
+        if n < 0 or n >= len(settings().statuses):
             await ctx.send("Invalid index, do `!liststatus`")
             return
         conf = BotConfirmation(ctx, 0x5555ff)
-        await conf.confirm(f'Delete `{config()["statuses"][n]}`?')
+        await conf.confirm(f'Delete `{settings().statuses[n]}`?')
 
         if conf.confirmed:
             try:
-                s = config()["statuses"][n]
-                del config()["statuses"][n]
-                save_config()
-                self.status = cycle(config()["statuses"])
+                s = store.pop("statuses", n)
+                self.status = cycle(settings().statuses)
                 self.status_rotate.restart()
             except Exception as e:  # noqa e722
                 await conf.update("An error occurred", color=0xffff00)
@@ -164,9 +202,8 @@ class Kaede(commands.Cog):
 
         if conf.confirmed:
             try:
-                config()["statuses"].append(w)
-                save_config()
-                self.status = cycle(config()["statuses"])
+                store.append("statuses", w)
+                self.status = cycle(settings().statuses)
                 self.status_rotate.restart()
             except Exception as e:  # noqa e722
                 await conf.update("An error occurred", color=0xffff00)
@@ -188,9 +225,8 @@ class Kaede(commands.Cog):
 
         if conf.confirmed:
             try:
-                config()["statuses"] = ["Hi"]
-                save_config()
-                self.status = cycle(config()["statuses"])
+                store.replace("statuses", ["Hi"])
+                self.status = cycle(settings().statuses)
                 self.status_rotate.restart()
             except Exception as e:  # noqa e722
                 await conf.update("An error occurred", color=0xffff00)
@@ -200,6 +236,21 @@ class Kaede(commands.Cog):
         else:
             await conf.update("Canceled", color=0xff5555)
 
+    @commands.command(name="metrics")
+    @commands.is_owner()
+    async def show_metrics(self, ctx: commands.Context):
+        """
+        Shows kaede's internal counters and timings
+        #OWNER
+        """
+        counters, histograms = metrics.summary()
+        lines = [f"{k}: {v}" for k, v in sorted(counters.items())]
+        lines += [f"{k}: n={n} mean={mean:.4g} p50={p50:.4g} p99={p99:.4g}"
+                  for k, (n, mean, p50, p99) in sorted(histograms.items())]
+        if not lines:
+            return await ctx.send("Nothing recorded yet")
+        await BotEmbedPaginator(ctx, pages(lines, 20, "Metrics")).run()
+
 
 def setup(bot: commands.Bot) -> None:
     bot.add_cog(Kaede(bot))
@@ -1,16 +1,23 @@
-import asyncio
 import datetime
 import logging
-from typing import Dict, List, Optional, Union
+import time
+from typing import Dict, FrozenSet, Optional, Union
 
 import discord
 from discord.ext import commands
 from disputils import BotEmbedPaginator
 
 import cogs
-from cogs.administration.punishments import Record
-from libs.config import config
-from libs.utils import pages, trash_reaction
+import scheduler
+from libs import startup
+from libs.config import config, emojis, settings
+from libs.journal import Kind, event, journal
+from libs.mutes import Mute, MuteStore
+from libs.outbound import Priority, outbound
+from libs.suppression import suppressions
+from libs.utils import has_config_role, pages, trash_reaction
+
+log = logging.getLogger("kaede.mod")
 
 MOD_HELP_STR = f"""
 **kick**
@@ -42,38 +49,52 @@ class Moderation(commands.Cog):
         self.bot = bot
         self.modlog: Optional[cogs.administration.modlog.ModLog] = None
         self.punishments: Optional[cogs.administration.punishments.Punishments] = None
+        self.scheduler: Optional[scheduler.Scheduler] = None
         bot.loop.create_task(self._init())
         self.user_cache = {}
-        self.active_mutes: List[int] = []
+        self.mutes = MuteStore()
         self.muted_role: Optional[discord.Role] = None
         self.staff: Optional[discord.Role] = None
         self.overwrite_restore: Dict[int, Optional[bool]] = {}
 
+    @startup.init("ModLog", "Punishments")
     async def _init(self):
-        logging.info("[MOD] Waiting for bot")
-        await self.bot.wait_until_ready()
         self.modlog = self.bot.get_cog("ModLog")
         self.punishments = self.bot.get_cog("Punishments")
-        self.muted_role = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["muted"])
-        self.staff = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["staff"])
-        for i in self.muted_role.members:
-            self.active_mutes.append(i.id)
-        logging.info("[MOD] Ready")
+        self.scheduler = self.bot.get_cog("Scheduler")
+        self.scheduler.register("unmute", self._timed_unmute)
+        self.scheduler.register("unsilence", self._timed_unsilence)
+        self._resolve()
+        if not self.mutes.seeded:
+            for member in self.muted_role.members:
+                self.mutes.add(Mute(member.id))
+            self.mutes.mark_seeded()
+        journal.subscribe("stats", journal.tally)
+        log.info("Ready")
+
+    def cog_unload(self):
+        journal.unsubscribe("stats")
+        self.mutes.close()
+
+    def _resolve(self):
+        roles, guild = settings().roles, startup.guild(self.bot)
+        self.muted_role = guild.get_role(roles["muted"])
+        self.staff = guild.get_role(roles["staff"])
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed: FrozenSet[str]):
+        if "roles" in changed:
+            self._resolve()
 
     @commands.command()
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def warn(self, ctx: commands.Context, member: discord.Member, *, reason: str = None):
         """
         Warns a user, optional reason
         #STAFF
         """
-        await self.punishments.insert_warn_record(Record(
-            reason=reason,
-            user=member.id,
-            staff=ctx.author.id
-        ))
-        await ctx.send(f"{member} warned", delete_after=60)
-        await self.modlog.log_warn_action(member, staff=ctx.author, reason=reason)
+        journal.append(event(Kind.WARN, member, ctx.author, reason))
+        self.scheduler.delete_after(await ctx.send(f"{member} warned"), 60)
 
     @commands.command(aliases=["warns"])
     async def warnlog(self, ctx: commands.Context, member: discord.Member):
@@ -111,15 +132,31 @@ class Moderation(commands.Cog):
             f" {datetime.datetime.utcfromtimestamp(w.timestamp).strftime('%b %d %y %H:%M:%S')}"
             for w in sorted(total, key=lambda x: x.timestamp)], 8, f"{member}'s Records", fmt="%s")).run()
 
+    @commands.command()
+    @has_config_role("staff")
+    async def modstats(self, ctx: commands.Context, days: int = 7):
+        """
+        Counts the moderation actions and filter hits of the last few days, by rule
+        #STAFF
+        """
+        tallies = journal.tallies(days)
+        if not tallies:
+            await ctx.send(f"No moderation actions in the last {days} days")
+            return
+        await BotEmbedPaginator(ctx, pages([
+            f"**{kind}**{f' - {rule}' if rule else ''}: {n}"
+            for (kind, rule), n in sorted(tallies.items(), key=lambda x: -x[1])],
+            15, f"Moderation in the last {days} days", fmt="%s")).run()
+
     @commands.command()
     @commands.has_permissions(kick_members=True)
     async def kick(self, ctx: commands.Context, member: discord.Member, *, reason: str = None):
         """
         #STAFF
         """
-        self.modlog.kaede_kicks.append(member.id)
+        suppressions.add("leave", member.id)
         await member.kick(reason=reason)
-        await self.modlog.log_kick_action(member, reason=reason, staff=ctx.author)
+        journal.append(event(Kind.KICK, member, ctx.author, reason))
         await ctx.send(f"`{member}` Kicked")
 
     @commands.command()
@@ -128,9 +165,9 @@ class Moderation(commands.Cog):
         """
         #STAFF
         """
-        self.modlog.kaede_kicks.append(member.id)
+        suppressions.add("leave", member.id)
         await member.kick(reason=reason)
-        await self.modlog.log_kick_action(member, silent=True, reason=reason, staff=ctx.author)
+        journal.append(event(Kind.KICK, member, ctx.author, reason, silent=True))
 
     @commands.command()
     @commands.has_permissions(ban_members=True)
@@ -151,11 +188,9 @@ class Moderation(commands.Cog):
             except discord.HTTPException as e:
                 await ctx.send(f"An error occurred while banning - {e}")
                 return
-        self.modlog.kaede_bans.append(user.id)
-        await self.modlog.log_ban_action(user, reason=reason, banned=True, staff=ctx.author)
-        await self.punishments.insert_ban_record(Record(
-            reason=reason, user=user.id, staff=ctx.author.id
-        ))
+        suppressions.add("ban", user.id)
+        suppressions.add("leave", user.id)
+        journal.append(event(Kind.BAN, user, ctx.author, reason))
         if isinstance(user, discord.Member):
             await user.ban(reason=f"{ctx.author} | {reason}")
         else:
@@ -181,8 +216,9 @@ class Moderation(commands.Cog):
             except discord.HTTPException as e:
                 await ctx.send(f"An error occurred while banning - {e}")
                 return
-        self.modlog.kaede_bans.append(user.id)
-        await self.modlog.log_ban_action(user, reason=reason, silent=True, banned=True, staff=ctx.author)
+        suppressions.add("ban", user.id)
+        suppressions.add("leave", user.id)
+        journal.append(event(Kind.BAN, user, ctx.author, reason, silent=True))
         if isinstance(user, discord.Member):
             await user.ban(reason=f"S | {ctx.author} | {reason}")
         else:
@@ -196,14 +232,15 @@ class Moderation(commands.Cog):
         """
         await member.send(f"You have been softbanned from {ctx.guild.name}. This is not a ban, but a kick+message "
                           f"delete.")
-        self.modlog.kaede_bans.append(member.id)
+        suppressions.add("ban", member.id)
+        suppressions.add("leave", member.id)
         await member.ban(reason=f"{ctx.author} | Soft Ban", delete_message_days=7)
-        self.modlog.kaede_unbans.append(member.id)
+        suppressions.add("unban", member.id)
         await member.unban(reason=f"{ctx.author} | Soft Ban")
-        await self.modlog.log_ban_action(member, soft=True, silent=True, staff=ctx.author, reason=reason)
+        journal.append(event(Kind.SOFTBAN, member, ctx.author, reason))
 
     @commands.command(aliases=["mhelp"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def modhelp(self, ctx: commands.Context):
         """
         #STAFF
@@ -217,44 +254,39 @@ class Moderation(commands.Cog):
         await trash_reaction(msg, self.bot, ctx)
 
     @commands.command()
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def mute(self, ctx: commands.Context, user: discord.Member):
         """
         Indefinitely mutes a user
         #STAFF
         """
-        if user.id in self.active_mutes:
+        if user.id in self.mutes:
             await ctx.send(f"{user} is already muted.")
             return
-        self.active_mutes.append(user.id)
+        self.mutes.add(Mute(user.id, staff=ctx.author.id))
         await user.add_roles(ctx.guild
                              .get_role(int(config()["roles"]["muted"])), reason=f"Muted by {ctx.author}")
-        await self.modlog.log_mute_action(user, manual=True, seconds=0, staff=ctx.author)
-        await self.punishments.insert_warn_record(Record(
-            reason="Mute",
-            user=user.id,
-            staff=ctx.author.id
-        ))
+        journal.append(event(Kind.MUTE, user, ctx.author, manual=True, seconds=0))
         await ctx.send(f"Muted {user}")
 
     @commands.command()
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def unmute(self, ctx: commands.Context, user: discord.Member):
         """
         Unmutes a user
         #STAFF
         """
-        if user.id not in self.active_mutes:
+        if not self.mutes.remove(user.id):
             await ctx.send(f"{user} is not muted.")
             return
-        del self.active_mutes[self.active_mutes.index(user.id)]
+        self.scheduler.cancel(f"unmute:{user.id}")
         await user.remove_roles(ctx.guild
                                 .get_role(int(config()["roles"]["muted"])), reason=f"Unmuted by {ctx.author}")
-        await self.modlog.log_mute_action(user, muted=False, manual=True, seconds=0, staff=ctx.author)
+        journal.append(event(Kind.UNMUTE, user, ctx.author, manual=True))
         await ctx.send(f"Unmuted {user}")
 
     @commands.command(aliases=["silence"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def sh(self, ctx: commands.Context, time: int = 10):
         """
         Silences a channel, so that only staff can speak. The default time is 10m
@@ -266,28 +298,39 @@ class Moderation(commands.Cog):
             await self.modlog.log_message("Channel silenced", f"Channel <#{ctx.channel.id}> silenced", ctx.author)
             s = f" for {time}m" if time else ""
             await ctx.send(f"Channel silenced{s}")
-            await asyncio.sleep(time * 60)
-            await self.unsilence_channel(ctx.channel)
-            await ctx.send("Channel unsilenced")
-            await self.modlog.log_message("Channel unsilenced", f"Channel <#{ctx.channel.id}> unsilenced", ctx.author)
+            self.scheduler.schedule("unsilence", time * 60, key=f"unsilence:{ctx.channel.id}",
+                                    channel=ctx.channel.id, restore=self.overwrite_restore[ctx.channel.id],
+                                    staff=ctx.author.id)
 
     @commands.command(aliases=["unsilence"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def unsh(self, ctx: commands.Context):
         """
         Unsilences a channel
         #STAFF
         """
         if await self.unsilence_channel(ctx.channel):
+            self.scheduler.cancel(f"unsilence:{ctx.channel.id}")
             await self.modlog.log_message("Channel unsilenced", f"Channel <#{ctx.channel.id}> unsilenced", ctx.author)
             await ctx.send("Channel unsilenced")
 
+    async def _timed_unsilence(self, data: Dict):
+        channel = self.bot.get_channel(data["channel"])
+        if not channel:
+            return
+        # after a restart the overwrite to restore is only in the timer
+        self.overwrite_restore.setdefault(channel.id, data["restore"])
+        if await self.unsilence_channel(channel):
+            outbound.send(channel, "Channel unsilenced", cog=self.qualified_name)
+            await self.modlog.log_message("Channel unsilenced", f"Channel <#{channel.id}> unsilenced",
+                                          channel.guild.get_member(data["staff"]))
+
     async def silence_channel(self, channel: discord.TextChannel):
         if channel.overwrites_for(channel.guild.default_role).send_messages is False:
             await self.modlog.log_message("Channel already silenced", f"Channel <#{channel.id}> already silenced",
                                           channel.guild.me)
             return False
-        if channel.category and channel.category.id in config()["restricted_categories"]:
+        if channel.category and channel.category.id in settings().restricted_categories:
             await self.modlog.log_message("Channel not silenced", f"Channel <#{channel.id}> in a restricted category",
                                           channel.guild.me)
             return False
@@ -313,33 +356,78 @@ class Moderation(commands.Cog):
         del self.overwrite_restore[channel.id]
         return True
 
+    async def _timed_unmute(self, data: Dict):
+        member = startup.guild(self.bot).get_member(data["user"])
+        if member:
+            await self.bot_unmute(member)
+        else:
+            self.mutes.remove(data["user"])
+
     async def bot_unmute(self, user: discord.Member):
-        if user.id not in self.active_mutes:
+        if not self.mutes.remove(user.id):
             return
-        del self.active_mutes[self.active_mutes.index(user.id)]
-        await user.remove_roles(self.muted_role, reason="Unmuted by Bot")
-        await self.modlog.log_mute_action(user, muted=False, seconds=0)
+        await outbound.member(user, lambda: user.remove_roles(self.muted_role, reason="Unmuted by Bot"),
+                              cog=self.qualified_name)
+        journal.append(event(Kind.UNMUTE, user))
 
     async def bot_mute(self, user: discord.Member, rule: str, seconds: int):
-        if user.id in self.active_mutes:
+        if user.id in self.mutes:
             return False
-        self.active_mutes.append(user.id)
-        try:
-            await user.send("Hey there! Looks like you were muted for spamming. Make sure you refrain from "
-                            "that in the future to avoid being kicked or banned.")
-        except discord.DiscordException:
-            pass
-        await self.punishments.insert_warn_record(Record(
-            reason=f"Auto Mute - {rule}",
-            user=user.id,
-            staff=self.bot.user.id
-        ))
-        await user.add_roles(self.muted_role, reason="Muted by Bot")
-        await self.modlog.log_mute_action(user, seconds=seconds, rule=rule)
-        self.bot.loop.call_later(seconds,
-                                 lambda: asyncio.ensure_future(self.bot_unmute(user)))
+        self.mutes.add(Mute(user.id, expiry=time.time() + seconds, rule=rule))
+        outbound.send(user, "Hey there! Looks like you were muted for spamming. Make sure you refrain from "
+                      "that in the future to avoid being kicked or banned.",
+                      priority=Priority.LOGGING, cog=self.qualified_name)
+        await outbound.member(user, lambda: user.add_roles(self.muted_role, reason="Muted by Bot"),
+                              cog=self.qualified_name)
+        journal.append(event(Kind.MUTE, user, rule=rule, seconds=seconds))
+        self.scheduler.schedule("unmute", seconds, key=f"unmute:{user.id}", user=user.id)
         return True
 
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        # the muted role given or taken by hand, or by another bot
+        muted = self.muted_role in after.roles
+        if muted == (self.muted_role in before.roles) or muted == (after.id in self.mutes):
+            return
+        if muted:
+            self.mutes.add(Mute(after.id))
+        else:
+            self.mutes.remove(after.id)
+            self.scheduler.cancel(f"unmute:{after.id}")
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        mute = self.mutes.get(member.id)
+        if not mute:
+            return
+        if mute.expired:
+            self.mutes.remove(member.id)
+            return
+        await outbound.member(member, lambda: member.add_roles(self.muted_role, reason="Muted before leaving"),
+                              cog=self.qualified_name)
+        await self.modlog.log_message("Mute Reapplied", f"{member} ({member.id}) left and rejoined while muted",
+                                      emoji=emojis.mute)
+
+    @commands.command(name="mutes")
+    @has_config_role("staff")
+    async def list_mutes(self, ctx: commands.Context):
+        """
+        Lists the muted members, why and until when
+        #STAFF
+        """
+        mutes = sorted(self.mutes, key=lambda m: m.since)
+        if not mutes:
+            await ctx.send("Nobody is muted")
+            return
+
+        def stamp(t: float) -> str:
+            return datetime.datetime.utcfromtimestamp(t).strftime('%b %d %y %H:%M:%S')
+
+        await BotEmbedPaginator(ctx, pages([
+            f"<@{m.user}> - {f'rule {m.rule}' if m.rule else f'by <@{m.staff}>' if m.staff else 'muted role'}\n"
+            f"- since {stamp(m.since)}, {f'until {stamp(m.expiry)}' if m.expiry else 'indefinitely'}"
+            for m in mutes], 8, "Mutes", fmt="%s")).run()
+
 
 def setup(bot: commands.Bot) -> None:
     bot.add_cog(Moderation(bot))
@@ -1,15 +1,30 @@
 import asyncio
+import functools
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Callable, FrozenSet, List, Optional, Union
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+from discord.http import Route
 
-from libs.config import config, emojis
+import scheduler
+from libs import startup
+from libs.config import config, emojis, settings
 from libs.conversions import seconds_to_str
+from libs.enforcement import WorkQueue
+from libs.journal import Event, Kind, Subject, event, journal
+from libs.logbatch import EmbedBatcher
+from libs.logs import DEBUG2
+from libs.messagestore import MessageStore, StoredMessage
+from libs.outbound import Priority, outbound
+from libs.raid import JoinVelocity
+from libs.suppression import suppressions
 from libs.utils import quote, trim
 
+log = logging.getLogger("kaede.modlog")
+
 AUTOKICK_STR = "Hey {user}!\n" \
                " Thank you for your interest in {guild}, but unfortunately we are only " \
                "allowing accounts older than {age} days to join. Even so, thanks for joining! Feel free " \
@@ -31,137 +46,230 @@ class ModLog(commands.Cog):
         self.modchannel: Optional[discord.TextChannel] = None
         self.greeting: Optional[discord.TextChannel] = None
         self.operator: Optional[discord.Role] = None
-        self.suppressed_deletion_messages = []
-        self.kaede_kicks = []
-        self.kaede_bans = []
-        self.kaede_unbans = []
-        self.suppressed_leaves = []
+        self.scheduler: Optional[scheduler.Scheduler] = None
+        self.batcher = EmbedBatcher("modlog", self._send_embeds, window=settings().log_batch)
+        c = config()["logging"].get("messages", {})
+        self.messages = MessageStore(c.get("file") or None, size=int(c.get("size", 16)) << 20,
+                                     entries=int(c.get("entries", 200000)))
+        self.raid = JoinVelocity(settings().raid)
+        self.joins = WorkQueue("joins", self._join, loop=bot.loop, workers=int(settings().raid["kicks"]), maxsize=1024)
+        self.raid_joins: List[discord.Member] = []  # welcomed together every so often in raid mode
+        self.verification: Optional[discord.VerificationLevel] = None  # to restore after a raid lockdown
         bot.loop.create_task(self._init())
 
+    @startup.init()
     async def _init(self):
-        logging.info("[MODLOG] Waiting for bot")
-        await self.bot.wait_until_ready()
-        self.logchannel = self.bot.get_channel(config()["channels"]["log"])
-        self.modchannel = self.bot.get_channel(config()["channels"]["modlog"])
-        self.greeting = self.bot.get_channel(config()["channels"]["greeting"])
-        self.operator = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["operator"])
-        logging.info("[MODLOG] Ready")
+        self.scheduler = self.bot.get_cog("Scheduler")
+        self._resolve()
+        journal.subscribe("modlog", self._render_event, self.batcher.drain)
+        self.prune_journal.start()
+        log.info("Ready")
+
+    def _resolve(self):
+        s = settings()
+        self.logchannel = self.bot.get_channel(s.channels["log"])
+        self.modchannel = self.bot.get_channel(s.channels["modlog"])
+        self.greeting = self.bot.get_channel(s.channels["greeting"])
+        self.operator = startup.guild(self.bot).get_role(s.roles["operator"])
+
+    def cog_unload(self):
+        self.prune_journal.cancel()
+        journal.unsubscribe("modlog")
+        self.batcher.flush_all()
+        self.messages.close()
+        self.joins.close()
+
+    @tasks.loop(hours=1)
+    async def prune_journal(self):
+        days = settings().journal_days
+        if days > 0:
+            pruned = journal.prune(days * 86400)
+            if pruned:
+                log.info(f"Pruned {pruned} journal events older than {days:g} days")
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed: FrozenSet[str]):
+        if changed & {"channels", "roles"}:
+            self._resolve()
+        if "logging" in changed:
+            self.batcher.window = settings().log_batch
+        if "raid" in changed:
+            self.raid.load(settings().raid)
+
+    async def _send(self, channel: discord.TextChannel, *args, **kwargs) -> discord.Message:
+        return await outbound.send(channel, *args, priority=Priority.LOGGING, cog=self.qualified_name, **kwargs)
+
+    def _log(self, channel: discord.TextChannel, embed: discord.Embed,
+             note: Callable[[discord.Message], str] = None) -> asyncio.Future:
+        """
+        Queues a log embed, to be sent with the others logged to the channel around the same time
+
+        :param note: makes the debug log line for the entry, from the message it was sent in
+        :return: a future of that message
+        """
+        future = self.batcher.add(channel, embed)
+        future.add_done_callback(functools.partial(_logged, note))
+        return future
+
+    def _send_embeds(self, channel: discord.TextChannel, embeds: List[discord.Embed]) -> asyncio.Future:
+        return outbound.submit(lambda: self._post_embeds(channel, embeds), ("send", channel.id),
+                               priority=Priority.LOGGING, cog=self.qualified_name)
+
+    async def _post_embeds(self, channel: discord.TextChannel, embeds: List[discord.Embed]) -> discord.Message:
+        if len(embeds) == 1:
+            return await channel.send(embed=embeds[0])
+        # discord.py only sends one embed per message, the API takes up to 10
+        data = await self.bot.http.request(Route("POST", "/channels/{channel_id}/messages", channel_id=channel.id),
+                                           json={"embeds": [e.to_dict() for e in embeds]})
+        return discord.Message(state=self.bot._connection, channel=channel, data=data)
 
     async def log_message(self, title: str, message: str, author: discord.Member = None, emoji: str = None):
         embed = discord.Embed(
             title=f"{emoji} {title}" if emoji else title,
             description=message,
-            colour=config()["colors"]["log_message"]
+            colour=settings().colors["log_message"]
         )
         if author:
             embed.set_author(name=f"{author} | {author.id}")
-        await self.logchannel.send(embed=embed)
+        self._log(self.logchannel, embed)
+
+    def _channel_name(self, channel_id: int) -> str:
+        channel = self.bot.get_channel(channel_id)
+        return channel.name if channel else str(channel_id)
 
-    async def log_edit(self, before: discord.Message, after: discord.Message):
-        if config()["logging"]["ignore_bot"] and before.author.bot:
+    async def log_edit(self, before: StoredMessage, after: str):
+        if settings().ignore_bot and before.bot:
             return
-        msg = await self.logchannel.send(
-            embed=discord.Embed(
-                title=f"{emojis.edit} Message Edited in #{before.channel.name}",
-                description=f"{before.author} | {before.author.id}\n"
-                            f"[Jump to message]({before.jump_url})",
-                colour=config()["colors"]["edit"]
+        self._log(
+            self.logchannel,
+            discord.Embed(
+                title=f"{emojis.edit} Message Edited in #{self._channel_name(before.channel_id)}",
+                description=f"{before.author_name} | {before.author_id}\n"
+                            f"[Jump to message](https://discord.com/channels/{startup.GUILD_ID}/"
+                            f"{before.channel_id}/{before.id})",
+                colour=settings().colors["edit"]
             )
                 .add_field(name="Before", value=trim(before.content))  # noqa 141
-                .add_field(name="After", value=trim(after.content))
+                .add_field(name="After", value=trim(after)),
+            lambda msg: f"EDIT {msg.id}\n---\n{quote(before.content)}\n---\n{quote(after)}"
         )
-        logging.log(15, f"[MODLOG | EDIT] {msg.id}\n---\n{quote(before.content)}\n---\n{quote(after.content)}")
-
-    async def log_filter(self, flt: str, message: discord.Message):
-        msg = await self.logchannel.send(
-            embed=discord.Embed(
-                title=f"{emojis.filter} Message Filtered in #{message.channel.name}",
-                description=f"{message.author} | {message.author.id}\n",
-                colour=config()["colors"]["filter"]
+
+    async def log_filter(self, flt: str, author: Union[discord.abc.User, Subject], channel: str, content: str,
+                         detail: str = None, deleted: bool = True):
+        rule = f"{flt} ({detail})" if detail else flt
+        self._log(
+            self.logchannel,
+            discord.Embed(
+                title=f"{emojis.filter} Message Filtered in #{channel}" + ("" if deleted else " - Delete Failed"),
+                description=f"{author} | {author.id}\n",
+                colour=settings().colors["filter"]
             )
-                .add_field(name="Content", value=trim(message.content))  # noqa 141
-                .set_footer(text=f"Rule: {flt}")
+                .add_field(name="Content", value=trim(content))  # noqa 141
+                .set_footer(text=f"Rule: {rule}"),
+            lambda msg: f"FILTER {msg.id} A:{author.id} R:{rule} {content}"
         )
-        self.suppressed_deletion_messages.append(message.id)
-        logging.log(15, f"[MODLOG | FILTER] {msg.id} A:{message.author.id} R:{flt} {message.content}")
 
-    async def log_delete(self, message: discord.Message):
-        if message.id in self.suppressed_deletion_messages:
-            del self.suppressed_deletion_messages[self.suppressed_deletion_messages.index(message.id)]
+    async def _render_event(self, e: Event):
+        # a journal consumer - a batch counts as handled once its embeds are sent, by draining the batcher
+        d = e.data
+        if e.kind is Kind.WARN:
+            await self.log_warn_action(e.user, reason=e.reason, staff=e.staff)
+        elif e.kind is Kind.MUTE:
+            await self.log_mute_action(e.user, manual=d.get("manual", False), seconds=d.get("seconds"),
+                                       staff=e.staff, rule=d.get("rule"))
+        elif e.kind is Kind.UNMUTE:
+            await self.log_mute_action(e.user, muted=False, manual=d.get("manual", False), seconds=0, staff=e.staff)
+        elif e.kind is Kind.KICK:
+            await self.log_kick_action(e.user, silent=d.get("silent", False), reason=e.reason, staff=e.staff)
+        elif e.kind in (Kind.BAN, Kind.UNBAN):
+            await self.log_ban_action(e.user, banned=e.kind is Kind.BAN, silent=d.get("silent", False),
+                                      reason=e.reason, staff=e.staff)
+        elif e.kind is Kind.SOFTBAN:
+            await self.log_ban_action(e.user, soft=True, silent=True, reason=e.reason, staff=e.staff)
+        elif e.kind is Kind.FILTER:
+            await self.log_filter(d["rule"], e.user, d["channel"], d["content"], e.reason, d.get("deleted", True))
+        elif e.kind is Kind.AUTOKICK:
+            await self.log_message("User Denied Entry", f"Member {e.user} ({e.user.id}) was denied "
+                                                        f"entry because their account was newer than "
+                                                        f"{d['days']} days\n"
+                                                        f"DM was {'not ' if not d['dm_sent'] else ''}sent",
+                                   emoji=emojis.autokick_on)
+
+    async def log_delete(self, message: StoredMessage):
+        s = settings()
+        if s.ignore_bot and message.bot:
             return
-        if config()["logging"]["ignore_bot"] == 1 and message.author.bot:
+        if message.content.startswith(s.ignore_del_prefix):
             return
-        for i in config()["logging"]["ignore_del_prefix"]:
-            if message.content.startswith(i):
-                return
-        msg = await self.logchannel.send(
-            embed=discord.Embed(
-                title=f"{emojis.delete} Message Deleted in #{message.channel.name}",
-                description=f"{message.author} | {message.author.id}\n",
-                colour=config()["colors"]["delete"],
-                timestamp=message.created_at
+        self._log(
+            self.logchannel,
+            discord.Embed(
+                title=f"{emojis.delete} Message Deleted in #{self._channel_name(message.channel_id)}",
+                description=f"{message.author_name} | {message.author_id}\n",
+                colour=settings().colors["delete"],
+                timestamp=datetime.utcfromtimestamp(message.created_at)
             )
                 .add_field(name="Content", value=trim(message.content))  # noqa 141
-                .set_footer(text="Send time")
+                .set_footer(text="Send time"),
+            lambda msg: f"DELETE {msg.id}: {msg.content}"
+        )
+
+    def _welcome(self, title: str, member: str) -> discord.Embed:
+        return discord.Embed(
+            title=title,
+            description=JOIN_STR.format(
+                guild=self.greeting.guild.name,
+                member=member,
+                role_channel=f"<#{settings().channels['roles']}>",
+                rules_channel=f"<#{settings().channels['rules']}>",
+                intro_channel=f"<#{settings().channels['intro']}>",
+                operator_role=self.operator.mention
+            )
         )
-        logging.log(15, f"[MODLOG | DELETE] {msg.id}: {msg.content}")
 
     async def log_user(self, member: Union[discord.Member, discord.User], join: bool):
         typ = "Bot" if member.bot else "User"
         st = "joined" if join else "left"
         if join:
-            embed = discord.Embed(
-                title=f"Welcome, {member.display_name}!",
-                description=JOIN_STR.format(
-                    guild=member.guild.name,
-                    member=member.mention,
-                    role_channel=f"<#{config()['channels']['roles']}>",
-                    rules_channel=f"<#{config()['channels']['rules']}>",
-                    intro_channel=f"<#{config()['channels']['intro']}>",
-                    operator_role=self.operator.mention
-                )
-            ).set_thumbnail(url=member.avatar_url)
-            await self.greeting.send(member.mention, delete_after=1)
-            await self.greeting.send(embed=embed)
+            embed = self._welcome(f"Welcome, {member.display_name}!", member.mention) \
+                .set_thumbnail(url=member.avatar_url)
+            self.scheduler.delete_after(await self._send(self.greeting, member.mention), 1)
+            await self._send(self.greeting, embed=embed)
         else:
-            if member.id in self.suppressed_leaves:
-                self.suppressed_leaves.remove(member.id)
+            if suppressions.consume("leave", member.id):
                 return
-            if member.id in self.kaede_bans:
-                self.kaede_bans.remove(member.id)
-                return
-            if member.id in self.kaede_kicks:
-                self.kaede_kicks.remove(member.id)
-                return
-            await self.greeting.send(f"{member.mention} ({member.display_name}) has left the chat.")
+            await self._send(self.greeting, f"{member.mention} ({member.display_name}) has left the chat.")
         emoji = emojis.user_join if join else emojis.user_leave
-        msg = await self.logchannel.send(
-            embed=discord.Embed(
+        self._log(
+            self.logchannel,
+            discord.Embed(
                 title=f"{emoji} {typ} {st}",
                 description=f"<@!{member.id}> `{member}`",
-                colour=config()["colors"]["user"]
+                colour=settings().colors["user"]
             )
                 .add_field(name="ID", value=str(member.id))  # noqa 141
                 .add_field(name="Joined Server", value=datetime.now().isoformat(), inline=False)
-                .add_field(name="Joined Discord", value=member.created_at.isoformat(), inline=False)
+                .add_field(name="Joined Discord", value=member.created_at.isoformat(), inline=False),
+            lambda msg: f"USER {msg.id} U:{member.id} JOIN:{join}"
         )
-        logging.log(15, f"[MODLOG | USER] {msg.id} U:{member.id} JOIN:{join}")
 
     async def log_kick_action(self, member: Union[discord.Member, discord.User], *,
                               silent: bool = False, reason: str = None, staff: discord.Member = None):
         if not silent:
-            await self.modchannel.send(
-                embed=discord.Embed(
+            self._log(
+                self.modchannel,
+                discord.Embed(
                     title="User Kicked",
                     description=f"{member} | <@!{member.id}>\n",
-                    colour=config()["colors"]["kick"]
+                    colour=settings().colors["kick"]
                 )
             )
-        await self.logchannel.send(
-            embed=discord.Embed(
+        self._log(
+            self.logchannel,
+            discord.Embed(
                 title="User Kicked",
                 description=f"{member} | <@!{member.id}>",
-                colour=config()["colors"]["kick"]
+                colour=settings().colors["kick"]
             )
             .add_field(name="Staff Member", value=f"{staff} | <@!{staff.id}>" if staff else "None", inline=False)
             .add_field(name="Reason", value=reason if reason else "None", inline=False)
@@ -171,11 +279,12 @@ class ModLog(commands.Cog):
                               manual: bool = False, seconds: int = None, staff: discord.Member = None,
                               rule: str = None):
         if muted:
-            await self.logchannel.send(
-                embed=discord.Embed(
+            self._log(
+                self.logchannel,
+                discord.Embed(
                     title=f"{emojis.mute} User Muted",
                     description=f"{member} | <@!{member.id}>",
-                    colour=config()["colors"]["mute"]
+                    colour=settings().colors["mute"]
                 )
                 .add_field(name="Staff Member", value=f"{staff} | <@!{staff.id}>" if staff else "None",
                            inline=False)
@@ -183,11 +292,12 @@ class ModLog(commands.Cog):
                 .add_field(name="Time", value=seconds_to_str(seconds) if seconds else "N/A")
             )
         else:
-            await self.logchannel.send(
-                embed=discord.Embed(
-                    title=f"{emojis.un} User Unmuted",
+            self._log(
+                self.logchannel,
+                discord.Embed(
+                    title=f"{emojis.unmute} User Unmuted",
                     description=f"{member} | <@!{member.id}>",
-                    colour=config()["colors"]["mute"]
+                    colour=settings().colors["mute"]
                 )
                 .add_field(name="Staff Member", value=f"{staff} | <@!{staff.id}>" if staff else "None",
                            inline=False)
@@ -195,11 +305,12 @@ class ModLog(commands.Cog):
             )
 
     async def log_warn_action(self, member: discord.Member, *, reason: str = None, staff: discord.Member = None):
-        await self.logchannel.send(
-            embed=discord.Embed(
+        self._log(
+            self.logchannel,
+            discord.Embed(
                 title="User Warned",
                 description=f"{member} | <@!{member.id}>",
-                colour=config()["colors"]["warn"]
+                colour=settings().colors["warn"]
             )
             .add_field(name="Staff Member", value=f"{staff} | <@!{staff.id}>" if staff else "None", inline=False)
             .add_field(name="Reason", value=reason if reason else "None", inline=False)
@@ -211,60 +322,169 @@ class ModLog(commands.Cog):
         action = "Soft-Banned" if soft else (" Banned" if banned else "Unbanned")
         emoji = emojis.softban if soft else (emojis.ban if banned else emojis.unban)
         if not silent:
-            await self.modchannel.send(
-                embed=discord.Embed(
+            self._log(
+                self.modchannel,
+                discord.Embed(
                     title=f"{emoji} User {action}",
                     description=f"{member} | <@!{member.id}>\n",
-                    colour=config()["colors"]["ban"]
+                    colour=settings().colors["ban"]
                 )
             )
-        await self.logchannel.send(
-            embed=discord.Embed(
+        self._log(
+            self.logchannel,
+            discord.Embed(
                 title=f"User {action}",
                 description=f"{member} | <@!{member.id}>",
-                colour=config()["colors"]["ban"]
+                colour=settings().colors["ban"]
             )
             .add_field(name="Staff Member", value=f"{staff} | <@!{staff.id}>" if staff else "None", inline=False)
             .add_field(name="Reason", value=reason if reason else "None", inline=False)
         )
 
+    # deletes and edits are resolved from discord.py's cache, and from the message store for messages it doesn't have
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if message.guild:
+            self.messages.put(message)
+
     @commands.Cog.listener()
-    async def on_message_edit(self, before: discord.Message, after: discord.Message):
-        if before.content != after.content:
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        if "content" not in payload.data or "guild_id" not in payload.data:
+            return
+        after = payload.data["content"]
+        before = self.messages.get(payload.message_id)
+        if payload.cached_message:
+            before = StoredMessage.of(payload.cached_message)
+        self.messages.update(payload.message_id, after)
+        if before and before.content != after:
             await self.log_edit(before, after)
 
     @commands.Cog.listener()
-    async def on_message_delete(self, message: discord.Message):
-        await self.log_delete(message)
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        await self._deleted(payload.message_id, payload.cached_message)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        cached = {m.id: m for m in payload.cached_messages}
+        for message_id in sorted(payload.message_ids):
+            await self._deleted(message_id, cached.get(message_id))
+
+    async def _deleted(self, message_id: int, cached: Optional[discord.Message]):
+        stored = self.messages.pop(message_id)
+        if suppressions.consume("delete", message_id):
+            return
+        if cached and cached.guild:
+            stored = StoredMessage.of(cached)
+        if stored:
+            await self.log_delete(stored)
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
-        if config()["autokick"] > 0:
+        if self.raid.add(time.monotonic()):
+            self.bot.loop.create_task(self._raid_mode())
+        await self.joins.put(member)
+
+    async def _join(self, member: discord.Member):
+        autokick = settings().autokick
+        if autokick > 0:
             now = datetime.utcnow()
-            td = timedelta(days=config()["autokick"])
+            td = timedelta(days=autokick)
             diff: timedelta = now - member.created_at
             if diff < td:
                 try:
-                    await member.send(AUTOKICK_STR.format(
+                    await outbound.send(member, AUTOKICK_STR.format(
                         user=member.mention,
                         guild=member.guild.name,
-                        age=config()["autokick"]
-                    ))
+                        age=autokick
+                    ), priority=Priority.MODERATION, cog=self.qualified_name)
                 except discord.Forbidden:
                     dm_sent = False
                 else:
                     dm_sent = True
-                await self.log_message("User Denied Entry", f"Member {member} ({member.id}) was denied "
-                                                            f"entry because their account was newer than "
-                                                            f"{config()['autokick']} days\n"
-                                                            f"DM was {'not ' if not dm_sent else ''}sent",
-                                       emoji=emojis.autokick_on)
-                self.suppressed_leaves.append(member.id)
+                journal.append(event(Kind.AUTOKICK, member, days=autokick, dm_sent=dm_sent))
+                suppressions.add("leave", member.id)
                 await asyncio.sleep(1)
-                await member.kick(reason="Autokick enabled, account too new")
+                await outbound.member(member, lambda: member.kick(reason="Autokick enabled, account too new"),
+                                      cog=self.qualified_name)
                 return
+        if self.raid.raiding:
+            self.raid_joins.append(member)
+            return
         await self.log_user(member, True)
 
+    async def _raid_mode(self):
+        raid = settings().raid
+        log.warning(f"Raid mode on, {self.raid.joins} joins in {self.raid.interval:g}s")
+        await self.log_message("Raid Mode On", f"{self.raid.joins} members joined within {self.raid.interval:g} "
+                                               f"seconds. Welcomes are grouped until there are "
+                                               f"{self.raid.cooldown:g} seconds without that many joins.")
+        joined = 0
+        try:
+            level = raid["lockdown"]  # checked when the config is loaded
+            if level and self.verification is None and level.value > startup.guild(self.bot).verification_level.value:
+                await self._lockdown(level, "Raid mode")
+            while True:
+                await asyncio.sleep(float(settings().raid["summary"]))
+                joined += await self._welcome_raid()
+                if self.raid.ended(time.monotonic()):
+                    break
+        finally:
+            self.raid.raiding = False  # already, unless something above failed
+            joined += await self._welcome_raid()
+            if self.verification is not None:
+                await self._lockdown(self.verification, "Raid mode over")
+                self.verification = None
+            log.warning(f"Raid mode off, {joined} members welcomed")
+            await self.log_message("Raid Mode Off", f"{joined} members joined and were welcomed during the raid")
+
+    async def _lockdown(self, level: discord.VerificationLevel, reason: str):
+        guild = startup.guild(self.bot)
+        previous = guild.verification_level
+        try:
+            await guild.edit(verification_level=level, reason=reason)
+        except discord.HTTPException as e:
+            log.error(f"Couldn't set the verification level to {level} - {e}")
+            return
+        if self.verification is None:
+            self.verification = previous
+        await self.log_message("Verification Level Changed", f"Verification level set to {level}")
+
+    async def _welcome_raid(self) -> int:
+        """
+        Welcomes everyone who joined since the last call, in one message and one log entry
+
+        :return: how many members were welcomed
+        """
+        members, self.raid_joins = self.raid_joins, []
+        if not members:
+            return 0
+        pings = ""
+        for member in members:
+            if len(pings) + len(member.mention) >= 2000:
+                self.scheduler.delete_after(await self._send(self.greeting, pings), 1)
+                pings = ""
+            pings += member.mention + " "
+        self.scheduler.delete_after(await self._send(self.greeting, pings), 1)
+        await self._send(self.greeting, embed=self._welcome(f"Welcome, {len(members)} new members!", "everyone"))
+        lines = [f"<@!{m.id}> `{m}` - joined Discord {m.created_at:%Y-%m-%d}" for m in members]
+        description = ""
+        for i, line in enumerate(lines):
+            if len(description) + len(line) > 1900:
+                description += f"and {len(lines) - i} more"
+                break
+            description += line + "\n"
+        self._log(
+            self.logchannel,
+            discord.Embed(
+                title=f"{emojis.user_join} {len(members)} Users joined",
+                description=description,
+                colour=settings().colors["user"]
+            ),
+            lambda msg: f"USER {msg.id} U:{','.join(str(m.id) for m in members)} JOIN:True"
+        )
+        return len(members)
+
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member):
         await self.log_user(member, False)
@@ -273,19 +493,24 @@ class ModLog(commands.Cog):
     @commands.Cog.listener()
     async def on_member_ban(self, guild: discord.Guild, user: Union[discord.User, discord.Member]):
         reason, staff, silent = None, None, False
-        if user.id in self.kaede_bans:
-            del self.kaede_bans[self.kaede_bans.index(user.id)]
+        if suppressions.consume("ban", user.id):
             return
-        await self.log_ban_action(user, reason=reason, banned=True, staff=staff, silent=silent)
+        journal.append(event(Kind.BAN, user, staff, reason, silent=silent))
 
     # noinspection PyUnusedLocal
     @commands.Cog.listener()
     async def on_member_unban(self, guild: discord.Guild, user: Union[discord.User, discord.Member]):
         reason, staff, silent = None, None, False
-        if user.id in self.kaede_unbans:
-            del self.kaede_unbans[self.kaede_unbans.index(user.id)]
+        if suppressions.consume("unban", user.id):
             return
-        await self.log_ban_action(user, reason=reason, staff=staff, silent=silent)
+        journal.append(event(Kind.UNBAN, user, staff, reason, silent=silent))
+
+
+def _logged(note: Optional[Callable[[discord.Message], str]], future: asyncio.Future):
+    # failed sends are logged by outbound
+    if future.cancelled() or future.exception() or not note:
+        return
+    log.log(DEBUG2, note(future.result()))
 
 
 def setup(bot: commands.Bot) -> None:
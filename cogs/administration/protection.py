@@ -1,11 +1,15 @@
 import logging
-from typing import Optional
+from typing import FrozenSet, Optional
 
 import discord
 from discord.ext import commands
 
 import cogs
-from libs.config import config, emojis, save_config
+from libs import startup
+from libs.config import emojis, settings, store
+from libs.utils import has_config_role
+
+log = logging.getLogger("kaede.protect")
 
 
 class Protection(commands.Cog):
@@ -15,18 +19,22 @@ class Protection(commands.Cog):
         bot.loop.create_task(self._init())
         self.staff: Optional[discord.Role] = None
 
+    @startup.init("ModLog")
     async def _init(self):
-        logging.info("[PROTECT] Waiting for bot")
-        await self.bot.wait_until_ready()
         self.modlog = self.bot.get_cog("ModLog")
-        self.staff = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["staff"])
-        logging.info("[PROTECT] Ready")
+        self.staff = startup.guild(self.bot).get_role(settings().roles["staff"])
+        log.info("Ready")
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed: FrozenSet[str]):
+        if "roles" in changed:
+            self.staff = startup.guild(self.bot).get_role(settings().roles["staff"])
 
     def _get_autokick_emoji(self):
-        return emojis.autokick_off if config()["autokick"] == 0 else emojis.autokick_on
+        return emojis.autokick_off if settings().autokick == 0 else emojis.autokick_on
 
     @commands.command(aliases=["ak"])
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     async def autokick(self, ctx: commands.Context, days: int = None):
         """
         Set the threshold age to kick new accounts at
@@ -36,14 +44,13 @@ class Protection(commands.Cog):
         #STAFF
         """
         if days is None:
-            st = "off" if config()["autokick"] == 0 else f"kicking accounts newer than " \
-                                                         f"{config()['autokick']} days"
+            st = "off" if settings().autokick == 0 else f"kicking accounts newer than " \
+                                                        f"{settings().autokick} days"
             await ctx.send(f"{self._get_autokick_emoji()} Autokick is {st}")
             return
-        config()['autokick'] = days
-        save_config()
-        st = "off" if config()["autokick"] == 0 else f"kicking accounts newer than " \
-                                                     f"{config()['autokick']} days"
+        store.set("autokick", days)
+        st = "off" if settings().autokick == 0 else f"kicking accounts newer than " \
+                                                    f"{settings().autokick} days"
         await ctx.send(f"{self._get_autokick_emoji()} Autokick is {st}")
 
 
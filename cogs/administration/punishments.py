@@ -6,6 +6,11 @@ from typing import List, Optional
 import aiosqlite
 from discord.ext import commands
 
+from libs import startup
+from libs.journal import Event, Kind, journal
+
+log = logging.getLogger("kaede.punishments")
+
 
 @dataclass
 class Record:
@@ -24,16 +29,34 @@ class Punishments(commands.Cog):
         self.conn: Optional[aiosqlite.Connection] = None
         bot.loop.create_task(self._init())
 
+    @startup.init()
     async def _init(self):
-        logging.info("[PUNISHMENTS] Waiting for bot")
-        await self.bot.wait_until_ready()
-        logging.info("[PUNISHMENTS] Connecting to database")
+        log.info("Connecting to database")
         self.conn = await aiosqlite.connect("punishments.db")
-        logging.info("[PUNISHMENTS] Ready")
+        journal.subscribe("punishments", self._record)
+        log.info("Ready")
+
+    def cog_unload(self):
+        journal.unsubscribe("punishments")
+
+    async def _record(self, e: Event):
+        # warns and mutes are kept as warn records, bans made through kaede as ban records
+        staff = e.staff.id if e.staff else self.bot.user.id
+        if e.kind is Kind.WARN:
+            await self.insert_warn_record(Record(user=e.user.id, staff=staff, reason=e.reason,
+                                                 timestamp=e.timestamp))
+        elif e.kind is Kind.MUTE:
+            reason = "Mute" if e.data.get("manual") else f"Auto Mute - {e.data.get('rule')}"
+            await self.insert_warn_record(Record(user=e.user.id, staff=staff, reason=reason,
+                                                 timestamp=e.timestamp))
+        elif e.kind is Kind.BAN and e.staff and not e.data.get("silent"):
+            await self.insert_ban_record(Record(user=e.user.id, staff=staff, reason=e.reason,
+                                                timestamp=e.timestamp))
 
     async def insert_warn_record(self, rec: Record):
         await self.conn.execute("insert into warns(user, staff, reason, timestamp) values (?,?,?,?)",
-                                (rec.user, rec.staff, rec.reason, datetime.datetime.utcnow().timestamp()))
+                                (rec.user, rec.staff, rec.reason,
+                                 rec.timestamp or datetime.datetime.utcnow().timestamp()))
         await self.conn.commit()
 
     async def get_warn_records(self, user_id: int) -> Optional[List[Record]]:
@@ -45,7 +68,8 @@ class Punishments(commands.Cog):
 
     async def insert_ban_record(self, rec: Record):
         await self.conn.execute("insert into bans(user, staff, reason, timestamp) values (?,?,?,?)",
-                                (rec.user, rec.staff, rec.reason, datetime.datetime.utcnow().timestamp()))
+                                (rec.user, rec.staff, rec.reason,
+                                 rec.timestamp or datetime.datetime.utcnow().timestamp()))
         await self.conn.commit()
 
     async def get_ban_records(self, user_id: int) -> Optional[List[Record]]:
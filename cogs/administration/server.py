@@ -1,12 +1,16 @@
 import logging
-from typing import Optional, Union
+from typing import FrozenSet, Optional, Union
 
 import discord
 from discord.ext import commands
 
 import cogs.administration.modlog
-from libs.config import config
+from libs import startup
+from libs.config import settings
 from libs.conversions import TimeDelta
+from libs.utils import has_config_role
+
+log = logging.getLogger("kaede.server")
 
 
 class Server(commands.Cog):
@@ -20,18 +24,26 @@ class Server(commands.Cog):
         self.admin: Optional[discord.Role] = None
         self.owner: Optional[discord.Role] = None
 
+    @startup.init("ModLog")
     async def _init(self):
-        logging.info("[SERVER] Waiting for bot")
-        await self.bot.wait_until_ready()
         self.modlog = self.bot.get_cog("ModLog")
-        self.staff = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["staff"])
-        self.jr_mod = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["jr_mod"])
-        self.mod = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["mod"])
-        self.admin = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["admin"])
-        self.owner = self.bot.get_guild(586199960198971409).get_role(config()["roles"]["owner"])
-        logging.info("[SERVER] Ready")
+        self._resolve()
+        log.info("Ready")
+
+    def _resolve(self):
+        roles, guild = settings().roles, startup.guild(self.bot)
+        self.staff = guild.get_role(roles["staff"])
+        self.jr_mod = guild.get_role(roles["jr_mod"])
+        self.mod = guild.get_role(roles["mod"])
+        self.admin = guild.get_role(roles["admin"])
+        self.owner = guild.get_role(roles["owner"])
+
+    @commands.Cog.listener()
+    async def on_config_reload(self, changed: FrozenSet[str]):
+        if "roles" in changed:
+            self._resolve()
 
-    @commands.has_role(config()["roles"]["jr_mod"])
+    @has_config_role("jr_mod")
     @commands.cooldown(1, 60, commands.BucketType.member)
     @commands.command(aliases=["sm", "slow"])
     async def slowmode(self, ctx: commands.Context, time: str):
@@ -55,7 +67,7 @@ class Server(commands.Cog):
                                               f"to {t} by {ctx.author.mention}",
                                       emoji=":clock1:")
 
-    @commands.has_role(config()["roles"]["mod"])
+    @has_config_role("mod")
     @commands.cooldown(1, 60, commands.BucketType.member)
     @commands.command(aliases=["bit", "br"])
     async def bitrate(self, ctx: commands.Context, rate: int, *, channel: Optional[Union[discord.VoiceChannel, str]]):
@@ -89,7 +101,7 @@ class Server(commands.Cog):
                                               f"to {rate}kbps by {ctx.author.mention}",
                                       emoji=":loudspeaker:")
 
-    @commands.has_role(config()["roles"]["mod"])
+    @has_config_role("mod")
     @commands.cooldown(1, 60, commands.BucketType.member)
     @commands.command(aliases=["maxusers"])
     async def max(self, ctx: commands.Context, num: int, *, channel: Optional[Union[discord.VoiceChannel, str]]):
@@ -123,7 +135,7 @@ class Server(commands.Cog):
                                               f"to {num}kbps by {ctx.author.mention}",
                                       emoji=":loudspeaker:")
 
-    @commands.has_role(config()["roles"]["admin"])
+    @has_config_role("admin")
     @commands.cooldown(1, 60, commands.BucketType.member)
     @commands.command(aliases=["rench"])
     async def renamechannel(self, ctx: commands.Context, channel: discord.TextChannel, *, name: str):
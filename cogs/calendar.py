@@ -2,20 +2,20 @@ import aiohttp
 import asyncio
 import logging
 import datetime as dt
-import pytz
 from dataclasses import dataclass
 from typing import Dict, Optional
 
 import aiosqlite
 import discord
-from dateutil.parser import parse
 from discord.ext import commands, tasks
 from discord.utils import escape_markdown, escape_mentions, find
 from disputils import BotMultipleChoice, BotEmbedPaginator, BotConfirmation
 
 import cogs.administration.modlog
-from libs.utils import pages, numbered, str_to_stamp, stamp_to_str
-from libs.config import config
+from libs import startup
+from libs.utils import has_config_role, pages, numbered, str_to_stamp, stamp_to_str
+
+log = logging.getLogger("kaede.calendar")
 
 
 def sanitize(s):
@@ -69,12 +69,13 @@ class Misc(commands.Cog):
         self.events = []
         self.timezones: Dict[int, str] = {}
         self.availabilities = []
+        bot.loop.create_task(self._load())
         bot.loop.create_task(self._init())
         self.end_check.start()
 
-    async def _init(self):
-        # load availabilities here
-        logging.info("[CAL] Waiting for bot")
+    async def _load(self):
+        # load availabilities here, without waiting for the bot
+        log.info("Loading database")
         async with aiosqlite.connect('calendar.db') as db:
             await db.execute(sql_string_avails_table)
             await db.execute(sql_string_events_table)
@@ -108,12 +109,14 @@ class Misc(commands.Cog):
                         if event_tup[0] not in self.timezones:
                             self.timezones[event_tup[0]] = event_tup[3]
 
-        await self.bot.wait_until_ready()
+    @startup.init("ModLog")
+    async def _init(self):
         self.modlog = self.bot.get_cog("ModLog")
-        logging.info("[CAL] Ready")
+        log.info("Ready")
 
     @tasks.loop(seconds=10)
     async def end_check(self):
+        import pytz
         async with self.lock:
             for n, avail in enumerate(self.availabilities):
                 offset = dt.datetime.now(pytz.timezone(avail.timezone)).utcoffset().total_seconds()
@@ -129,7 +132,7 @@ class Misc(commands.Cog):
             self.availabilities = [avail for avail in self.availabilities if avail is not None]
 
         for event in self.events:
-            guild = self.bot.get_guild(586199960198971409)
+            guild = startup.guild(self.bot)
             offset = dt.datetime.now(pytz.timezone(event.timezone)).utcoffset().total_seconds()
             utc = dt.datetime.utcnow() + dt.timedelta(seconds=offset)
             date_start = dt.datetime.fromtimestamp(event.date_start)
@@ -169,6 +172,8 @@ class Misc(commands.Cog):
         Set date as: day/month/year
         Set start & end in 24 hour format
         """
+        from dateutil.parser import parse
+
         if parse(start) > parse(end):
             await ctx.send(embed=discord.Embed(title='The start time must be before the end time',
                                                colour=0xFF0000))
@@ -260,7 +265,7 @@ class Misc(commands.Cog):
             else:
                 await confirmation.update("Not confirmed", hide_author=True, color=0xFF0000)
 
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     @commands.command()
     async def availabilities(self, ctx: commands.Context, member: discord.Member):
         """
@@ -275,7 +280,7 @@ class Misc(commands.Cog):
             gen),
             n=10, title=f'{member.display_name}\'s availabilities'))).run()
 
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     @commands.command()
     async def upcoming(self, ctx: commands.Context, date: str = None):
         """
@@ -284,6 +289,8 @@ class Misc(commands.Cog):
         Input date as: day/month/year
         #STAFF
         """
+        from dateutil.parser import parse
+
         if date is None:
             gen_week = [
                 (ctx.guild.get_member(avail.userid).display_name + ":\n" + stamp_to_str(avail.date_start) + " - " +
@@ -305,7 +312,7 @@ class Misc(commands.Cog):
                 gen_date),
                 n=10, title=f'Availabilities for {parse(date).strftime("%Y-%b-%d")}'))).run()
 
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     @commands.command()
     async def schedule(self, ctx: commands.Context, name: str, date: str, start: str, end: str,
                        channel: discord.TextChannel, role: discord.Role = None):
@@ -317,6 +324,8 @@ class Misc(commands.Cog):
         [] = optional
         #STAFF
         """
+        from dateutil.parser import parse
+
         if ctx.author.id in self.timezones:
             user_tz = self.timezones[ctx.author.id]
         else:
@@ -361,7 +370,7 @@ class Misc(commands.Cog):
         else:
             await confirmation.update("Not confirmed", hide_author=True, color=0xFF0000)
 
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     @commands.command()
     async def delevent(self, ctx: commands.Context):
         """
@@ -1,26 +1,36 @@
 import logging
 import random
-from typing import List, Tuple, Union
+from typing import Dict, List, Tuple, Union
 
 import discord
 from discord.ext import commands
 from disputils import BotConfirmation, BotEmbedPaginator
 
-from libs.config import config
-from libs.utils import pages, trash_send
+from libs.analysis import analyze
+from libs.outbound import outbound
+from libs.utils import has_config_role, pages, trash_send
+
+log = logging.getLogger("kaede.reactions")
 
 
 class CustomReactions(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.reactions: List[Tuple[str, str]] = []
-        logging.info("[CUS] Loading config")
+        self.triggers: Dict[str, List[str]] = {}
+        log.info("Loading config")
         self._load_cr()
-        logging.info(f"[CUS] Found {len(self.reactions)} custom reactions")
+        log.info(f"Found {len(self.reactions)} custom reactions")
 
     def _save_cr(self):
         with open("configs/custom_reactions.csv", "w") as fp:
             fp.writelines([f"{e[0]}\t{e[1]}\n" for e in self.reactions])
+        self._index()
+
+    def _index(self):
+        self.triggers = {}
+        for trigger, response in self.reactions:
+            self.triggers.setdefault(trigger, []).append(response)
 
     def _load_cr(self):
         self.reactions = []
@@ -30,8 +40,9 @@ class CustomReactions(commands.Cog):
                     continue
                 entry = i.strip().split("\t")
                 self.reactions.append((entry[0].lower(), entry[1]))
+        self._index()
 
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     @commands.command(aliases=["acr"])
     async def addcustomreaction(self, ctx: commands.Context, trigger: str, *, response: str):
         """
@@ -60,7 +71,7 @@ class CustomReactions(commands.Cog):
                 cs_list.append(f"{n + 1}: **{r[0]}** - {r[1]}")
         return cs_list
 
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     @commands.command(aliases=["lcr"])
     async def listcustomreactions(self, ctx: commands.Context, trigger: str = None):
         """
@@ -74,7 +85,7 @@ class CustomReactions(commands.Cog):
             return await ctx.send(f"No reactions found for trigger `{trigger}`")
         await BotEmbedPaginator(ctx, pages(cs_list, 10, "Reactions", fmt="%s")).run()
 
-    @commands.has_role(config()["roles"]["staff"])
+    @has_config_role("staff")
     @commands.command(aliases=["dcr"])
     async def delcustomreaction(self, ctx: commands.Context, trigger: Union[int, str]):
         """
@@ -108,15 +119,13 @@ class CustomReactions(commands.Cog):
     async def on_message(self, message: discord.Message):
         if message.author.bot:
             return
-        reactions = self._search(message.content.lower())
-        if len(reactions) == 0:
+        responses = self.triggers.get(analyze(message).lower)
+        if not responses:
             return
-        sel = random.choice(reactions)
-        num = int(sel.split(":")[0])
-        await message.channel.send(self.reactions[num - 1][1]
-                                   .replace("%user.mention%", message.author.mention)
-                                   .replace("%user%", str(message.author))
-                                   .replace("%guild%", message.guild.name))
+        outbound.send(message.channel, random.choice(responses)
+                      .replace("%user.mention%", message.author.mention)
+                      .replace("%user%", str(message.author))
+                      .replace("%guild%", message.guild.name), cog=self.qualified_name)
 
     @commands.command()
     async def placeholders(self, ctx: commands.Context):
@@ -5,8 +5,7 @@ from discord.ext import commands
 from disputils import BotEmbedPaginator
 
 import cogs.administration.moderation
-from libs.config import config
-from libs.utils import pages, trash_reaction
+from libs.utils import has_staff_role, pages, trash_reaction
 
 NL = "\n"
 
@@ -19,7 +18,7 @@ class Help(commands.Cog):
         if not hs_parsed[1]:
             return True
         for r in hs_parsed[1]:
-            if r == "#STAFF" and config()["roles"]["staff"] in [r.id for r in ctx.author.roles]:
+            if r == "#STAFF" and has_staff_role(ctx.author):
                 return True
             if r == "#OWNER" and await self.bot.is_owner(ctx.author):
                 return True
@@ -93,7 +92,7 @@ class Help(commands.Cog):
                            s + "\n" +
                            ("Aliases: " + ",".join(f"`{x}`" for x in i.aliases) + "\n" if i.aliases else ""))
         embeds = pages(lst, 7, "Help", fmt="%s")
-        if config()["roles"]["staff"] in [r.id for r in ctx.author.roles]:
+        if has_staff_role(ctx.author):
             embeds.append(discord.Embed(title="Help", description=cogs.administration.moderation.MOD_HELP_STR))
         await BotEmbedPaginator(ctx, embeds).run()
 
@@ -9,12 +9,13 @@ import subprocess
 from typing import Dict
 
 import discord
-import mcstatus
 from discord.ext import commands, tasks
 
 from libs.mcrcon import MinecraftClient
 from libs.utils import mc_to_md
 
+log = logging.getLogger("kaede.united")
+
 
 async def ping(url: str):
     ping_var = "-n" if platform.system() == "Windows" else "-c"
@@ -25,7 +26,7 @@ async def ping(url: str):
     try:
         with concurrent.futures.ThreadPoolExecutor() as pool:
             s = await asyncio.get_event_loop().run_in_executor(pool, pshell, url)
-        print(s)
+        log.debug(s)
         try:
             if platform.system() != "Windows":
                 ar = s.strip("\n\r").split("\r\n")[-1].split(" ")[-2].split("/")
@@ -34,17 +35,16 @@ async def ping(url: str):
                 ar = s.strip("\n\r").split("\r\n")[-1].split(" ")
                 return ar[-7].strip(","), ar[-4].strip(",")
         except Exception as e:
-            print(e)
+            log.warning(f"Couldn't parse the ping of {url}: {e!r}")
     except Exception as e:
-        print(e)
-        print(type(e))
+        log.warning(f"Couldn't ping {url}: {e!r}")
         return "ERR", "ERR"
 
 
 class UnitedMC(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        logging.info("[UNITED] Loading server list")
+        log.info("Loading server list")
         self.servers = {}
         self._load_server_list()
 
@@ -162,10 +162,10 @@ class UnitedMC(commands.Cog):
         await ctx.send("Server config reloaded! :D")
 
     def _load_server_list(self):
-        logging.info("[SVR] Loading server config...")
+        log.info("Loading server config...")
         with open("servers.json") as js:
             self.servers = json.load(js)
-        logging.info("[SVR] Server config loaded! :D")
+        log.info("Server config loaded! :D")
 
     @commands.command(name="server")
     async def _server(self, ctx: commands.Context, server: str):
@@ -207,8 +207,9 @@ class UnitedMC(commands.Cog):
             except Exception as e:
                 await ctx.send("An unknown error happened"
                                " while I was pinging the server.")
-                print(e)
+                log.warning(f"Couldn't ping {svr['ip']}:{svr['port']}: {e!r}")
         else:
+            import mcstatus
             server = mcstatus.MinecraftServer.lookup(f'{svr["ip"]}:{svr["port"]}')
             status = server.status()
             e = discord.Embed()
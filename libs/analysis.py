@@ -0,0 +1,108 @@
+import re
+from collections import OrderedDict
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+import discord
+
+from libs.config import settings
+from libs.filters import extract_hosts, extract_links
+from libs.normalize import skeleton
+
+_token = re.compile(r"\w+")
+
+# bot prefixes, mentions first, as `commands.when_mentioned_or` orders them - built by :func:`load_prefixes`
+prefixes: Tuple[str, ...] = ()
+
+
+def load_prefixes(bot: discord.Client) -> Tuple[str, ...]:
+    """
+    Builds the prefix tuple from the config, call once the bot is logged in and whenever the config is reloaded
+    """
+    global prefixes
+    mentions = (f"<@{bot.user.id}> ", f"<@!{bot.user.id}> ") if bot.user else ()
+    prefixes = mentions + settings().prefixes
+    return prefixes
+
+
+class MessageAnalysis:
+    """
+    Derived forms of a message's content, each computed the first time a listener asks for it and then shared
+    by every other listener of the same message
+    """
+
+    def __init__(self, message: discord.Message):
+        self.message = message
+        self.content: str = message.content
+
+    @cached_property
+    def lower(self) -> str:
+        return self.content.lower()
+
+    @cached_property
+    def skeleton(self) -> str:
+        """
+        The content folded with :func:`libs.normalize.skeleton`, leetspeak included
+        """
+        return skeleton(self.content, leet=True)
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        """
+        The words of the skeleton
+        """
+        return _token.findall(self.skeleton)
+
+    @cached_property
+    def hosts(self) -> List[str]:
+        """
+        The normalized hosts of the links in the content
+        """
+        return extract_hosts(self.content)
+
+    @cached_property
+    def links(self) -> List[str]:
+        """
+        The normalized hosts of what's meant as a link, unlike :attr:`hosts` which also has anything shaped like one
+        """
+        return extract_links(self.content)
+
+    @cached_property
+    def mentions(self) -> int:
+        m = self.message
+        return len(m.mentions) + len(m.role_mentions) + m.mention_everyone
+
+    @cached_property
+    def prefix(self) -> Optional[str]:
+        """
+        The bot prefix the content starts with, or None
+        """
+        if not self.content.startswith(prefixes):
+            return None
+        return next(p for p in prefixes if self.content.startswith(p))
+
+    @cached_property
+    def command(self) -> Optional[str]:
+        """
+        The name of the command invoked by the content, or None
+        """
+        if self.prefix is None:
+            return None
+        words = self.content[len(self.prefix):].split(maxsplit=1)
+        return words[0] if words else None
+
+
+_cache: "OrderedDict[int, MessageAnalysis]" = OrderedDict()
+CACHE_SIZE = 256
+
+
+def analyze(message: discord.Message) -> MessageAnalysis:
+    """
+    :return: the shared analysis of a message, made on the first call for it. An edited message gets a new one.
+    """
+    analysis = _cache.get(message.id)
+    if analysis is None or analysis.content != message.content:
+        analysis = _cache[message.id] = MessageAnalysis(message)
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return analysis
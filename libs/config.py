@@ -1,9 +1,25 @@
+import logging
+import os
 from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
 
+import discord
 from ruamel.yaml import YAML
 
+from libs.store import Store
+
+CONFIG_PATH = os.getenv("KAEDE_CONFIG", "config.yaml")
+DEFAULT_CONFIG_PATH = "config-default.yaml"
+STORE_PATH = os.getenv("KAEDE_STORE", "kaede.db")
+
 _config = None
+_mtime: Optional[int] = None
 yaml = YAML()
+log = logging.getLogger("kaede.config")
+
+# taken whole from the config when it has them, rather than merged with the defaults key by key
+_WHOLE = {("automod", "rules")}
 
 
 @dataclass
@@ -22,25 +38,177 @@ class EmojiList:
     autokick_off: str
 
 
+@dataclass(frozen=True)
+class Settings:
+    """
+    An immutable, typed view of the config, for the reads done on every message or command. Rebuilt whenever the
+    config is loaded or changed, or the store is written to, see :func:`settings`.
+    """
+    roles: Mapping[str, int]
+    channels: Mapping[str, int]
+    colors: Mapping[str, int]
+    staff_role: int
+    prefixes: Tuple[str, ...]
+    role_whitelist: FrozenSet[int]
+    delete_exceptions: FrozenSet[int]
+    restricted_categories: FrozenSet[int]
+    ignore_del_prefix: Tuple[str, ...]
+    ignore_bot: bool
+    log_batch: float
+    journal_days: float
+    autokick: int
+    statuses: Tuple[str, ...]
+    status_cycle: int
+    duplicates: Mapping[str, float]
+    raid: Mapping[str, Any]  # `lockdown` is a discord.VerificationLevel, or None
+    config_watch: float
+
+    @classmethod
+    def from_config(cls, c) -> "Settings":
+        return cls(
+            roles=MappingProxyType({k: int(v) for k, v in c["roles"].items()}),
+            channels=MappingProxyType({k: int(v) for k, v in c["channels"].items() if not isinstance(v, list)}),
+            colors=MappingProxyType({k: int(v) for k, v in c["colors"].items()}),
+            staff_role=int(c["roles"]["staff"]),
+            prefixes=tuple(str(p) for p in c["prefixes"]),
+            role_whitelist=frozenset(map(int, c["filters"]["role_whitelist"])),
+            delete_exceptions=frozenset(map(int, c["delete_exceptions"])),
+            restricted_categories=frozenset(map(int, c["restricted_categories"])),
+            ignore_del_prefix=tuple(str(p) for p in c["logging"]["ignore_del_prefix"]),
+            ignore_bot=bool(c["logging"]["ignore_bot"]),
+            log_batch=float(c["logging"].get("batch", 1)),
+            journal_days=float(c["logging"].get("journal_days", 30)),
+            autokick=int(store.get("autokick", 0)),
+            statuses=store.list("statuses") or ("Hi",),
+            status_cycle=int(c["status_cycle"]),
+            duplicates=MappingProxyType({k: float(v) for k, v in c["automod"]["duplicates"].items()}),
+            raid=MappingProxyType({**c["raid"], "lockdown": _verification_level(c["raid"].get("lockdown"))}),
+            config_watch=float(c.get("config_watch", 0)),
+        )
+
+
+def _verification_level(name: Optional[str]) -> Optional[discord.VerificationLevel]:
+    if not name:
+        return None
+    try:
+        return discord.VerificationLevel[str(name).lower()]
+    except KeyError:
+        raise ValueError(f"raid.lockdown: unknown verification level {name!r}") from None
+
+
 emojis: EmojiList
+_settings: Optional[Settings] = None
+
+
+def diff(old: Optional[Mapping], new: Mapping, depth: int = 2) -> FrozenSet[str]:
+    """
+    :return: the dotted paths of the keys whose values differ between two configs, down to `depth` levels - a
+        changed `filters.word_blacklist` gives both `filters` and `filters.word_blacklist`
+    """
+    old = old or {}
+    changed = set()
+    for key in set(old) | set(new):
+        a, b = old.get(key), new.get(key)
+        if a == b:
+            continue
+        changed.add(str(key))
+        if depth > 1 and isinstance(a, Mapping) and isinstance(b, Mapping):
+            changed |= {f"{key}.{k}" for k in diff(a, b, depth - 1)}
+    return frozenset(changed)
+
+
+def _swap(new) -> FrozenSet[str]:
+    global _config, _settings, emojis
+    store.seed(new)
+    # everything derived is built before anything is replaced, so a bad config leaves the current one in place
+    new_settings = Settings.from_config(new)
+    new_emojis = EmojiList(**new["emojis"])
+    changed = diff(_config, new)
+    _config, _settings = new, new_settings
+    if "emojis" in globals():
+        # updated in place, as the cogs hold on to it from `from libs.config import emojis`
+        vars(emojis).update(vars(new_emojis))
+    else:
+        emojis = new_emojis
+    return changed
 
 
-def reload_config():
-    global _config, emojis
-    with open("config.yaml") as fp:
-        _config = yaml.load(fp)
-    emojis = EmojiList(
-        **_config["emojis"]
-    )
+def _merge(defaults: Mapping, c: Mapping, path: Tuple[str, ...] = ()) -> Dict:
+    """
+    :return: the config with whatever it's missing taken from the defaults, section by section
+    """
+    merged = dict(defaults)
+    for key, value in c.items():
+        default = defaults.get(key)
+        if isinstance(default, Mapping) and isinstance(value, Mapping) and path + (key,) not in _WHOLE:
+            value = _merge(default, value, path + (key,))
+        merged[key] = value
+    return merged
 
 
-def save_config():
-    with open("config.yaml", "w") as fp:
-        yaml.dump(_config, fp)
+def _migrate(c: Mapping):
+    # automod.burst became the `burst` rule of automod.rules
+    automod = c.get("automod") or {}
+    if "burst" in automod and "rules" not in automod:
+        log.warning("Moving automod.burst to automod.rules.burst, update the config file")
+        automod["rules"] = {"burst": {"metric": "messages", **automod.pop("burst")}}
+
+
+def reload_config() -> FrozenSet[str]:
+    """
+    Loads the config file, over the defaults from the default config file for sections it doesn't have yet
+
+    :return: what changed since the last load, see :func:`diff`
+    """
+    global _mtime
+    try:
+        with open(DEFAULT_CONFIG_PATH) as fp:
+            defaults = yaml.load(fp)
+    except FileNotFoundError:
+        defaults = {}
+    with open(CONFIG_PATH) as fp:
+        _mtime = os.fstat(fp.fileno()).st_mtime_ns
+        c = yaml.load(fp)
+    _migrate(c)
+    return _swap(_merge(defaults, c))
+
+
+def modified() -> bool:
+    """
+    :return: whether the config file was changed on disk since the bot last loaded it
+    """
+    try:
+        return os.stat(CONFIG_PATH).st_mtime_ns != _mtime
+    except FileNotFoundError:
+        return False
+
+
+def _store_changed(name: str):
+    global _settings
+    _settings = Settings.from_config(_config)
 
 
 def config():
     return _config
 
 
+def filters_config() -> Dict:
+    """
+    :return: the `filters` section, with the blacklists the commands edit taken from the store
+    """
+    return dict(_config["filters"],
+                word_blacklist=list(store.list("word_blacklist")),
+                token_blacklist=list(store.list("token_blacklist")))
+
+
+def settings() -> Settings:
+    """
+    :return: the current config snapshot. Hold on to it rather than calling again to read several values that must
+        agree with each other.
+    """
+    return _settings
+
+
+store = Store(STORE_PATH)
+store.listeners.append(_store_changed)
 reload_config()
@@ -0,0 +1,163 @@
+import itertools
+import operator
+import re
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Hashable, List, Set, Tuple
+
+_whitespace = re.compile(r"\s+")
+_EMPTY = 1 << 62
+_MASK = (1 << 57) - 1
+_OFFSET = 0x9e3779b97f4a7c1
+
+
+@dataclass
+class Entry:
+    id: int
+    time: float
+    member: int
+    channel: int
+    signature: array
+    bands: List[Hashable]
+
+
+@dataclass
+class Verdict:
+    member_matches: int = 0
+    member_channels: int = 0
+    guild_matches: int = 0
+    guild_members: int = 0
+
+
+class DuplicateDetector:
+    """
+    Keeps a rolling window of MinHash signatures of recent messages, to find messages that are near-identical to
+    ones already sent, by the same member or by anyone.
+
+    Signatures are `k` 64 bit integers (one-permutation MinHash over character shingles) in a fixed-size array.
+    They are indexed by LSH bands, so a new message is only compared with messages that share a band instead of
+    with the whole window, and each comparison is a single pass over two arrays.
+    """
+
+    def __init__(self, *, k: int = 64, bands: int = 16, shingle: int = 5, threshold: float = 0.8,
+                 window: float = 60, min_length: int = 20, max_entries: int = 5000):
+        if k % bands:
+            raise ValueError("k must be a multiple of bands")
+        self.k = k
+        self.bits = (k - 1).bit_length()
+        if 1 << self.bits != k:
+            raise ValueError("k must be a power of 2")
+        self.rows = k // bands
+        self.shingle = shingle
+        self.threshold = threshold
+        self.window = window
+        self.min_length = min_length
+        self.max_entries = max_entries
+        self._ids = itertools.count()
+        self._entries: Deque[Entry] = deque()
+        self._index: Dict[Hashable, Set[int]] = {}
+        self._by_id: Dict[int, Entry] = {}
+
+    def signature(self, text: str) -> array:
+        """
+        :param text: the normalized message content
+        :return: the MinHash signature of the text's character shingles
+        """
+        text = _whitespace.sub(" ", text).strip()
+        shingles = map("".join, zip(*(text[i:] for i in range(self.shingle)))) if len(text) >= self.shingle \
+            else (text,)
+        mask, bits = self.k - 1, self.bits
+        # descending, so the minimum of each bin is the value left in the dict
+        bins = {h & mask: h >> bits for h in sorted(set(map(hash, shingles)), reverse=True)}
+        return self._densify(array("q", [bins.get(i, _EMPTY) for i in range(self.k)]))
+
+    def _densify(self, sig: array) -> array:
+        # short messages leave bins empty, which would make every short message collide in the LSH index -
+        # fill each empty bin from the next filled one, offset by the distance so the bins stay distinct
+        if _EMPTY not in sig:
+            return sig
+        k = self.k
+        empty = [v == _EMPTY for v in sig]
+        src = None
+        for i in range(2 * k - 1, -1, -1):
+            if not empty[i % k]:
+                src = i
+            elif i < k and src is not None:
+                sig[i] = (sig[src % k] + (src - i) * _OFFSET) & _MASK
+        return sig
+
+    def _bands(self, sig: array) -> List[Hashable]:
+        r = self.rows
+        return [(i, hash(tuple(sig[i * r:(i + 1) * r]))) for i in range(self.k // r)]
+
+    def similarity(self, a: array, b: array) -> float:
+        """
+        Estimates the Jaccard similarity of the shingle sets of two signatures
+        """
+        return sum(map(operator.eq, a, b)) / self.k
+
+    def _expire(self, now: float):
+        entries = self._entries
+        while entries and (entries[0].time <= now - self.window or len(entries) > self.max_entries):
+            entry = entries.popleft()
+            del self._by_id[entry.id]
+            for band in entry.bands:
+                bucket = self._index.get(band)
+                if bucket is not None:
+                    bucket.discard(entry.id)
+                    if not bucket:
+                        del self._index[band]
+
+    def check(self, member: int, channel: int, text: str, now: float = None) -> Verdict:
+        """
+        Compares a message with the window, then adds it to the window
+
+        :param member: the author's ID
+        :param channel: the channel's ID
+        :param text: the normalized message content
+        :param now: the time of the message, defaults to a monotonic clock
+        :return: how many near-identical messages were found, and across how many channels/members
+        """
+        verdict = Verdict()
+        if len(text) < self.min_length:
+            return verdict
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        sig = self.signature(text)
+        bands = self._bands(sig)
+        candidates: Set[int] = set()
+        for band in bands:
+            bucket = self._index.get(band)
+            if bucket:
+                candidates |= bucket
+        channels: Set[int] = {channel}
+        members: Set[int] = {member}
+        for entry_id in candidates:
+            entry = self._by_id[entry_id]
+            if self.similarity(sig, entry.signature) < self.threshold:
+                continue
+            verdict.guild_matches += 1
+            members.add(entry.member)
+            if entry.member == member:
+                verdict.member_matches += 1
+                channels.add(entry.channel)
+        verdict.member_channels = len(channels)
+        verdict.guild_members = len(members)
+
+        entry = Entry(next(self._ids), now, member, channel, sig, bands)
+        self._entries.append(entry)
+        self._by_id[entry.id] = entry
+        for band in bands:
+            self._index.setdefault(band, set()).add(entry.id)
+        return verdict
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Tuple[int, int]:
+        """
+        :return: the number of signatures and LSH buckets held
+        """
+        return len(self._entries), len(self._index)
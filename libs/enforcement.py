@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List
+
+from libs import metrics
+
+
+class WorkQueue:
+    """
+    A bounded queue drained by a fixed number of worker tasks, so a flood of work can't spawn unbounded tasks.
+    :meth:`put` waits for room once the queue is full, which pushes back on whatever is producing the work.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], *, workers: int = 4,
+                 maxsize: int = 256, loop: asyncio.AbstractEventLoop = None):
+        self.name = name
+        self.handler = handler
+        self.log = logging.getLogger(f"kaede.{name}")
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        loop = loop or asyncio.get_event_loop()
+        self._workers: List[asyncio.Task] = [loop.create_task(self._work()) for _ in range(workers)]
+
+    async def _work(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa e722
+                metrics.incr(f"{self.name}.errors")
+                self.log.exception("Handler failed")
+            finally:
+                self.queue.task_done()
+
+    async def put(self, item: Any):
+        if self.queue.full():
+            metrics.incr(f"{self.name}.full")
+        await self.queue.put(item)
+        metrics.observe(f"{self.name}.depth", self.queue.qsize())
+
+    async def join(self):
+        """
+        Waits until every queued item has been handled
+        """
+        await self.queue.join()
+
+    def close(self):
+        for task in self._workers:
+            task.cancel()
@@ -0,0 +1,625 @@
+import hashlib
+import logging
+import re
+from collections import OrderedDict, deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Set, Tuple
+
+from libs import metrics
+from libs.normalize import INVISIBLE, LEETSPEAK, skeleton
+from libs.tlds import TLDS
+
+log = logging.getLogger("kaede.filter")
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_parse
+
+WORD_FMT = r"(?:-|\b)(?:{})(?:-|\b)"
+TOKEN_FMT = r"{}"
+MAX_PATTERN_LENGTH = 200
+
+# hostnames, with or without a scheme - ports, paths and userinfo are left out of the match
+url_regex = re.compile(r"(?:(?<=://)|(?<![\w.\u3002\uff0e\uff61-]))((?:[\w-]+[.\u3002\uff0e\uff61])+[\w-]+)")
+# IDNA label separators, and the invisible characters used to split up links
+_HOST_TABLE = {**{ord(c): "." for c in "\u3002\uff0e\uff61"}, **{ord(c): None for c in INVISIBLE}}
+
+
+def normalize_host(host: str) -> str:
+    """
+    Normalizes a hostname (or URL) for blacklist lookups - lowercased, punycoded and without
+    scheme, userinfo, port, path or a leading `www.`
+
+    :param host: the hostname
+    :return: the normalized hostname
+    """
+    host = host.translate(_HOST_TABLE).strip().lower().split("://")[-1].split("/")[0]
+    host = host.rsplit("@", 1)[-1].split(":")[0].strip(".")
+    try:
+        host = host.encode("idna").decode("ascii")
+    except UnicodeError:
+        pass
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+
+def extract_hosts(text: str) -> List[str]:
+    """
+    Extracts and normalizes every hostname in a piece of text
+    """
+    return [normalize_host(m) for m in url_regex.findall(text.translate(_HOST_TABLE))]
+
+
+# top-level domains that are more often file extensions - `main.py` and `README.md` aren't links
+_FILE_TLDS = frozenset("ai app cc gd io java md mk ml mov pl pm properties ps py rs sh so zip".split())
+
+
+def extract_links(text: str) -> List[str]:
+    """
+    Like :func:`extract_hosts`, but only the hosts meant as links, leaving out versions and file names like `1.16.5`,
+    `config.yml` or `main.py`. A host counts with a scheme, or if it ends in a real top-level domain - for the ones in
+    `_FILE_TLDS`, only with `www.` or a path after it.
+    """
+    text = text.translate(_HOST_TABLE)
+    links = []
+    for m in url_regex.finditer(text):
+        host = normalize_host(m.group(1))
+        tld = host.rsplit(".", 1)[-1]
+        if text.endswith("://", 0, m.start()) or tld in TLDS and (
+                tld not in _FILE_TLDS or m.group(1).lower().startswith("www.") or text.startswith("/", m.end())):
+            links.append(host)
+    return links
+
+
+def host_skeleton(host: str) -> str:
+    """
+    :param host: a normalized hostname
+    :return: the confusable-folded skeleton of the hostname, as it would be displayed
+    """
+    if "xn--" in host:
+        try:
+            host = host.encode("ascii").decode("idna")
+        except UnicodeError:
+            pass
+    return skeleton(host, leet=True)
+
+
+class DomainMatcher:
+    """
+    A hashed set of blacklisted domains. A host matches if it, or any of its parent domains, is blacklisted,
+    so lookups cost the same no matter how long the list is.
+
+    Hosts that aren't one of the protected domains, but fold to the same skeleton as one (`yoütu.be`, `d1scord.com`),
+    match as lookalikes.
+    """
+
+    def __init__(self, domains: Iterable[str], protected: Iterable[str] = ()):
+        self.domains: FrozenSet[str] = frozenset(filter(None, (normalize_host(str(d)) for d in domains)))
+        self.protected: Dict[str, str] = {host_skeleton(d): d
+                                          for d in filter(None, (normalize_host(str(d)) for d in protected))}
+
+    def __len__(self):
+        return len(self.domains)
+
+    def match_host(self, host: str) -> Optional[str]:
+        """
+        :param host: a normalized hostname
+        :return: the blacklisted domain the host falls under, or None
+        """
+        while True:
+            if host in self.domains:
+                return host
+            if self.protected:
+                lookalike = self.protected.get(host_skeleton(host))
+                if lookalike and lookalike != host:
+                    return f"{host} (lookalike of {lookalike})"
+            dot = host.find(".")
+            if dot == -1:
+                return None
+            host = host[dot + 1:]
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        :param text: the text to scan for hostnames
+        :return: the first blacklisted domain found, or None
+        """
+        if not self.domains and not self.protected:
+            return None
+        for host in extract_hosts(text):
+            domain = self.match_host(host)
+            if domain:
+                return domain
+        return None
+
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)} - {None}
+_ZERO_WIDTH = {sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT}
+
+
+def _best(factors: List[FrozenSet[str]]) -> Optional[FrozenSet[str]]:
+    # the factor set whose shortest literal is longest is the most selective
+    return max(factors, key=lambda f: min(map(len, f)), default=None)
+
+
+def _factors(items) -> Optional[FrozenSet[str]]:
+    """
+    Finds a set of literals at least one of which occurs in any match of the parsed (sub)pattern
+
+    :return: the set of literals, or None if no such set could be found
+    """
+    factors: List[FrozenSet[str]] = []
+    run = ""
+
+    def flush():
+        nonlocal run
+        if run:
+            factors.append(frozenset((run,)))
+        run = ""
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run += chr(av)
+        elif op in _ZERO_WIDTH:
+            continue
+        elif op in _REPEATS:
+            lo, hi, sub = av
+            if lo and len(sub) == 1 and sub[0][0] is sre_parse.LITERAL:
+                run += chr(sub[0][1]) * lo
+                if hi != lo:
+                    flush()
+                continue
+            flush()
+            if lo:
+                f = _factors(sub)
+                if f:
+                    factors.append(f)
+        elif op is sre_parse.SUBPATTERN:
+            flush()
+            _, add_flags, _, sub = av
+            f = None if add_flags & sre_parse.SRE_FLAG_IGNORECASE else _factors(sub)
+            if f:
+                factors.append(f)
+        elif op is getattr(sre_parse, "ATOMIC_GROUP", None):
+            flush()
+            f = _factors(av)
+            if f:
+                factors.append(f)
+        elif op is sre_parse.BRANCH:
+            flush()
+            branches = [_factors(b) for b in av[1]]
+            if all(branches):
+                factors.append(frozenset().union(*branches))
+        else:
+            flush()
+    flush()
+    return _best(factors)
+
+
+def _matches_leet(items) -> bool:
+    # whether a parsed (sub)pattern can match a character the skeleton folds as leetspeak
+    for op, av in items:
+        if op is sre_parse.LITERAL and chr(av) in LEETSPEAK:
+            return True
+        if op is sre_parse.IN:
+            for op_, av_ in av:
+                if op_ is sre_parse.LITERAL and chr(av_) in LEETSPEAK or op_ is sre_parse.RANGE and any(
+                        av_[0] <= ord(c) <= av_[1] for c in LEETSPEAK) or av_ is sre_parse.CATEGORY_DIGIT:
+                    return True
+        for sub in av if isinstance(av, (tuple, list)) else (av,):
+            if isinstance(sub, sre_parse.SubPattern) and _matches_leet(sub):
+                return True
+            if isinstance(sub, list) and any(isinstance(b, sre_parse.SubPattern) and _matches_leet(b) for b in sub):
+                return True
+    return False
+
+
+def matches_leet(pattern: str) -> bool:
+    """
+    :return: whether the regex has digits or symbols in it that the leetspeak folding of the skeleton replaces, so it
+        has to be run against text folded without it
+    """
+    return _matches_leet(sre_parse.parse(pattern))
+
+
+def required_literals(pattern: str) -> Optional[FrozenSet[str]]:
+    """
+    Extracts the literal factors of a regex - any string the regex matches contains at least one of them
+
+    :param pattern: the regex
+    :return: the literals, or None if the pattern has no usable literal factor
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & (sre_parse.SRE_FLAG_IGNORECASE | sre_parse.SRE_FLAG_VERBOSE):
+        return None
+    return _factors(parsed)
+
+
+_WILDCARD = "*"
+
+
+def _overlaps(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+    return bool(a and b and (a & b or _WILDCARD in a or _WILDCARD in b))
+
+
+def _first(items) -> Tuple[FrozenSet[str], bool]:
+    """
+    Approximates the characters a parsed (sub)pattern can start with - character classes count as a wildcard
+
+    :return: a tuple of (first characters, whether the pattern can match the empty string)
+    """
+    first = frozenset()
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            return first | {chr(av)}, False
+        if op in _ZERO_WIDTH:
+            continue
+        if op in _REPEATS:
+            f, nullable = _first(av[2])
+            first |= f
+            if av[0] and not nullable:
+                return first, False
+        elif op is sre_parse.SUBPATTERN or op is getattr(sre_parse, "ATOMIC_GROUP", None):
+            f, nullable = _first(av[-1] if op is sre_parse.SUBPATTERN else av)
+            first |= f
+            if not nullable:
+                return first, False
+        elif op is sre_parse.BRANCH:
+            branches = [_first(b) for b in av[1]]
+            first = first.union(*(f for f, _ in branches))
+            if not any(n for _, n in branches):
+                return first, False
+        else:
+            return first | {_WILDCARD}, False
+    return first, True
+
+
+def _complexity(items, in_repeat: bool = False, follow: FrozenSet[str] = frozenset()) -> Optional[str]:
+    previous = None
+    for op, av in items:
+        if op in _REPEATS:
+            lo, hi, sub = av
+            unbounded = hi == sre_parse.MAXREPEAT
+            if in_repeat and hi != lo:
+                return "nested quantifiers, e.g. `(a+)+`"
+            f, _ = _first(sub)
+            if unbounded and previous is not None and _overlaps(previous, f):
+                return "adjacent quantifiers that can match the same text, e.g. `a*a*`"
+            reason = _complexity(sub, in_repeat or hi > 1, f if hi > 1 else follow)
+            if reason:
+                return reason
+            previous = f if unbounded else (previous if lo == 0 else None)
+        elif op is sre_parse.SUBPATTERN or op is getattr(sre_parse, "ATOMIC_GROUP", None):
+            reason = _complexity(av[-1] if op is sre_parse.SUBPATTERN else av, in_repeat, follow)
+            if reason:
+                return reason
+            previous = None
+        elif op is sre_parse.BRANCH:
+            branches = [_first(b) for b in av[1]]
+            if in_repeat:
+                if sum(n for _, n in branches) > 1:
+                    return "an alternation with several empty branches inside a quantifier"
+                # an empty branch is followed by the next repetition
+                firsts = [f | follow if n else f for f, n in branches]
+                for i, a in enumerate(firsts):
+                    if any(_overlaps(a, b) for b in firsts[i + 1:]):
+                        return "an alternation with overlapping branches inside a quantifier, e.g. `(a|a.)+`"
+            for b in av[1]:
+                reason = _complexity(b, in_repeat, follow)
+                if reason:
+                    return reason
+            previous = None
+        elif op is sre_parse.GROUPREF:
+            return "backreferences"
+        elif op not in _ZERO_WIDTH:
+            previous = None
+    return None
+
+
+def regex_complexity(pattern: str) -> Optional[str]:
+    """
+    Statically checks a regex for constructs prone to catastrophic backtracking
+
+    :param pattern: the regex
+    :return: why the pattern was rejected, or None if it looks safe
+    """
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return f"longer than {MAX_PATTERN_LENGTH} characters"
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        return f"invalid regex ({e})"
+    return _complexity(parsed)
+
+
+class AhoCorasick:
+    """
+    An Aho-Corasick automaton, finding every occurrence of a set of literals in a single pass
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[FrozenSet[str]] = [frozenset()]
+        for w in words:
+            state = 0
+            for c in w:
+                if c not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(frozenset())
+                    self.goto[state][c] = len(self.goto) - 1
+                state = self.goto[state][c]
+            self.out[state] |= {w}
+        queue = deque(self.goto[0].values())
+        while queue:
+            r = queue.popleft()
+            for c, state in self.goto[r].items():
+                queue.append(state)
+                f = self.fail[r]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[state] = self.goto[f].get(c, 0) if r else 0
+                self.out[state] |= self.out[self.fail[state]]
+
+    def scan(self, text: str) -> Set[str]:
+        """
+        :param text: the text to scan
+        :return: every literal that occurs in the text
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        root = goto[0]
+        hits = set()
+        state = 0
+        for c in text:
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0) if state else root.get(c, 0)
+            if out[state]:
+                hits |= out[state]
+        return hits
+
+
+# group names, backreferences and conditionals, which can't be wrapped in another rule's alternation
+_GROUP_REFS = re.compile(r"\(\?P[<=]|\(\?\(|\\[1-9]")
+
+
+class RuleSet:
+    """
+    A class of blacklist rules compiled into a single alternation, with one named group per rule so the
+    rule that fired can be recovered from the match. Rules that name or refer to groups are kept out of it and
+    evaluated on their own, as are all of them if the alternation doesn't compile.
+    """
+
+    def __init__(self, name: str, patterns: Iterable[str], fmt: str = TOKEN_FMT, exclude: Iterable[str] = ()):
+        self.name = name
+        self.fmt = fmt
+        self.patterns: List[str] = []
+        self.compiled: List[Pattern] = []
+        for p in patterns:
+            p = str(p)
+            if p in self.patterns or p in exclude:
+                continue
+            try:
+                self.compiled.append(re.compile(fmt.format(p)))
+            except re.error as e:
+                log.warning(f"Skipping invalid {name} rule `{p}`: {e}")
+                continue
+            self.patterns.append(p)
+        self.regex: Optional[Pattern] = None
+        self.separate = [i for i, p in enumerate(self.patterns) if _GROUP_REFS.search(p)]
+        combined = [i for i in range(len(self.patterns)) if i not in self.separate]
+        if combined:
+            try:
+                self.regex = re.compile(fmt.format("|".join(f"(?P<r{i}>{self.patterns[i]})" for i in combined)))
+            except re.error as e:
+                log.warning(f"Evaluating the {name} rules one at a time, they don't compile together: {e}")
+                self.separate = list(range(len(self.patterns)))
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        Scans the text once for every rule in the set
+
+        :param text: the (lowercased) text to scan
+        :return: the pattern of the rule that fired, or None
+        """
+        m = self.regex.search(text) if self.regex else None
+        if m:
+            return self.patterns[int(m.lastgroup[1:])]
+        return self.search_rules(text, self.separate)
+
+    def search_rules(self, text: str, rules: Iterable[int]) -> Optional[str]:
+        """
+        Evaluates only the given rules against the text
+
+        :param text: the (lowercased) text to scan
+        :param rules: the indices of the rules to evaluate
+        :return: the pattern of the first rule that fired, or None
+        """
+        for i in sorted(rules):
+            if self.compiled[i].search(text):
+                return self.patterns[i]
+        return None
+
+
+class Prefilter:
+    """
+    Maps the required literals of every rule to the rule, so a single automaton pass over a message picks out
+    the only rules that could possibly match it. Rules without a usable literal are always evaluated.
+    """
+
+    def __init__(self, rule_sets: Iterable[RuleSet]):
+        self.literal_rules: Dict[str, Set[Tuple[int, int]]] = {}
+        self.always: Set[Tuple[int, int]] = set()
+        for s, rule_set in enumerate(rule_sets):
+            for i, p in enumerate(rule_set.patterns):
+                literals = required_literals(p)
+                if not literals:
+                    self.always.add((s, i))
+                    continue
+                for lit in literals:
+                    self.literal_rules.setdefault(lit, set()).add((s, i))
+        self.automaton = AhoCorasick(self.literal_rules)
+
+    def candidates(self, text: str) -> Set[Tuple[int, int]]:
+        """
+        :param text: the (lowercased) text
+        :return: (rule set, rule) index pairs of the rules that have to be evaluated
+        """
+        rules = set(self.always)
+        for lit in self.automaton.scan(text):
+            rules |= self.literal_rules[lit]
+        return rules
+
+
+class FilterEngine:
+    """
+    Compiled word/token/domain blacklists. Rebuild it with :meth:`compile` whenever the lists change.
+    """
+
+    def __init__(self, filters: Dict = None, *, prefilter: bool = True):
+        self.rule_sets: Tuple[RuleSet, ...] = ()
+        self.domains = DomainMatcher(())
+        self.use_prefilter = prefilter
+        self.prefilter: Optional[Prefilter] = None
+        self.plain_rules: FrozenSet[Tuple[int, int]] = frozenset()
+        self.filters: Dict = {}
+        self.quarantined: Set[str] = set()
+        self.version = 0
+        self.compile(filters or {})
+
+    # the keys under `filters` that :meth:`compile` reads
+    INPUTS = ("word_blacklist", "token_blacklist", "domain_blacklist", "protected_domains")
+
+    def compile(self, filters: Dict):
+        self.filters = filters
+        self.rule_sets = (
+            RuleSet("word_blacklist", filters.get("word_blacklist", []), WORD_FMT, self.quarantined),
+            RuleSet("token_blacklist", filters.get("token_blacklist", []), TOKEN_FMT, self.quarantined),
+        )
+        self.domains = DomainMatcher(filters.get("domain_blacklist", []), filters.get("protected_domains", []))
+        self.prefilter = Prefilter(self.rule_sets) if self.use_prefilter else None
+        # rules with leetspeak characters in them, which can't match the skeleton
+        self.plain_rules: FrozenSet[Tuple[int, int]] = frozenset(
+            (s, i) for s, rule_set in enumerate(self.rule_sets) for i, p in enumerate(rule_set.patterns)
+            if matches_leet(p))
+        self.version += 1
+        log.info("Compiled " + ", ".join(f"{len(r)} {r.name} rules" for r in self.rule_sets) +
+                 f", {len(self.domains)} blacklisted and {len(self.domains.protected)} protected domains")
+
+    def quarantine(self, pattern: str):
+        """
+        Disables a rule until the bot restarts, even if it's deleted from its list in the store and added again
+        """
+        self.quarantined.add(pattern)
+        self.compile(self.filters)
+
+    def rules(self) -> Dict[str, List[str]]:
+        """
+        :return: the valid, non-quarantined patterns of every rule class
+        """
+        return {rule_set.name: list(rule_set.patterns) for rule_set in self.rule_sets}
+
+    def candidates(self, text: str, plain: str = None) -> Set[Tuple[int, int]]:
+        """
+        :param text: the (lowercased) text
+        :param plain: the text folded without leetspeak, for :attr:`plain_rules`
+        :return: (rule set, rule) index pairs of the rules that could match the text
+        """
+        if self.prefilter is None:
+            candidates = {(s, i) for s, rule_set in enumerate(self.rule_sets) for i in range(len(rule_set))}
+        else:
+            candidates = self.prefilter.candidates(text)
+        if self._plain(text, plain) and self.prefilter is not None:
+            candidates |= self.prefilter.candidates(plain) & self.plain_rules
+        return candidates
+
+    def _plain(self, text: str, plain: Optional[str]) -> bool:
+        return bool(self.plain_rules) and plain is not None and plain != text
+
+    def check(self, text: str, plain: str = None) -> Optional[Tuple[str, str]]:
+        """
+        Checks the text against every rule class
+
+        :param text: the (lowercased) text to check
+        :param plain: the text folded without leetspeak, which :attr:`plain_rules` are also run against
+        :return: a tuple of (rule class, pattern) for the first rule class that fired, or None
+        """
+        if self.prefilter is None:
+            for rule_set in self.rule_sets:
+                pattern = rule_set.search(text)
+                if pattern is not None:
+                    return rule_set.name, pattern
+        else:
+            hit = self._search(text, self.prefilter.candidates(text))
+            if hit:
+                return hit
+        if not self._plain(text, plain):
+            return None
+        if self.prefilter is None:
+            return self._search(plain, self.plain_rules)
+        return self._search(plain, self.prefilter.candidates(plain) & self.plain_rules)
+
+    def _search(self, text: str, candidates: Iterable[Tuple[int, int]]) -> Optional[Tuple[str, str]]:
+        candidates = set(candidates)
+        if not candidates:
+            return None
+        for s, rule_set in enumerate(self.rule_sets):
+            pattern = rule_set.search_rules(text, (i for t, i in candidates if t == s))
+            if pattern is not None:
+                return rule_set.name, pattern
+        return None
+
+    def check_domains(self, text: str) -> Optional[str]:
+        """
+        Checks the links in the text against the domain blacklist
+
+        :param text: the text to check
+        :return: the blacklisted domain that was linked, or None
+        """
+        return self.domains.search(text)
+
+
+class VerdictCache:
+    """
+    An LRU of filter verdicts, keyed by a digest of the text that was scanned and dropped whenever the engine is
+    recompiled, so text that has already been scanned (an unchanged message being edited) is never scanned again
+    """
+    MISS = object()
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.version: Optional[int] = None
+        self._verdicts: "OrderedDict[bytes, Optional[Tuple[str, str]]]" = OrderedDict()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def get(self, key: bytes, version: int):
+        """
+        :return: the cached verdict for the key under that engine version, or :attr:`MISS`
+        """
+        if version != self.version:
+            self._verdicts.clear()
+            self.version = version
+        verdict = self._verdicts.get(key, self.MISS)
+        if verdict is self.MISS:
+            metrics.incr("verdict_cache.misses")
+        else:
+            metrics.incr("verdict_cache.hits")
+            self._verdicts.move_to_end(key)
+        return verdict
+
+    def put(self, key: bytes, version: int, verdict: Optional[Tuple[str, str]]):
+        if version != self.version:
+            return
+        self._verdicts[key] = verdict
+        if len(self._verdicts) > self.size:
+            self._verdicts.popitem(last=False)
+
+    def __len__(self):
+        return len(self._verdicts)
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import discord
+
+from libs import metrics
+
+log = logging.getLogger("kaede.journal")
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            user INTEGER NOT NULL,
+            user_name TEXT,
+            staff INTEGER,
+            staff_name TEXT,
+            reason TEXT,
+            data TEXT NOT NULL,
+            timestamp REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS checkpoints (
+            consumer TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tallies (
+            day TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, kind, rule)
+            );"""
+
+BATCH = 100
+RETRIES = 5
+
+
+class Kind(str, Enum):
+    WARN = "warn"
+    MUTE = "mute"
+    UNMUTE = "unmute"
+    KICK = "kick"
+    BAN = "ban"
+    UNBAN = "unban"
+    SOFTBAN = "softban"
+    FILTER = "filter"
+    AUTOKICK = "autokick"
+
+
+class Subject(NamedTuple):
+    """
+    A user as recorded in an event, enough to render it without fetching them
+    """
+    id: int
+    name: str
+
+    def __str__(self):
+        return self.name
+
+
+@dataclass
+class Event:
+    kind: Kind
+    user: Subject
+    staff: Optional[Subject] = None
+    reason: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)  # what only some kinds have - mute lengths, rules...
+    id: Optional[int] = None
+    timestamp: Optional[float] = None
+
+
+def event(kind: Kind, user: Union[discord.abc.User, Subject], staff: Union[discord.abc.User, Subject] = None,
+          reason: str = None, **data) -> Event:
+    return Event(kind, Subject(user.id, str(user)), Subject(staff.id, str(staff)) if staff else None, reason, data)
+
+
+class Consumer:
+    """
+    Feeds every event after its checkpoint to a handler, one at a time, reading them in batches and moving the
+    checkpoint past a batch once `flush` returns - events are handled at least once, across restarts. An event the
+    handler keeps failing on is retried, then skipped, without handling the events around it again.
+    """
+
+    def __init__(self, journal: "Journal", name: str, handler: Callable[[Event], Awaitable[None]],
+                 flush: Callable[[], Awaitable[None]] = None):
+        self.journal = journal
+        self.name = name
+        self.handler = handler
+        self.flush = flush
+        self.position = journal.checkpoint(name)
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()
+        self.task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while True:
+                events = self.journal.read(self.position, BATCH)
+                if not events:
+                    break
+                for e in events:
+                    await self._handle(e)
+                    self.position = e.id
+                if self.flush:
+                    try:
+                        await self.flush()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception:  # noqa e722
+                        metrics.incr(f"journal.{self.name}.errors")
+                        log.exception(f"{self.name} failed to flush events {events[0].id}-{events[-1].id}")
+                self.journal.save_checkpoint(self.name, self.position)
+                metrics.observe(f"journal.{self.name}.lag", time.time() - events[-1].timestamp)
+
+    async def _handle(self, e: Event):
+        failures = 0
+        while True:
+            try:
+                return await self.handler(e)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa e722
+                failures += 1
+                metrics.incr(f"journal.{self.name}.errors")
+                if failures >= RETRIES:
+                    log.exception(f"{self.name} failed on event {e.id}, skipping it")
+                    return
+                log.exception(f"{self.name} failed on event {e.id}, retrying")
+                await asyncio.sleep(2 ** failures)
+
+    def close(self):
+        self.task.cancel()
+
+
+class Journal:
+    """
+    An append-only log of moderation events. Commands append to it, which is one local insert, and the modlog,
+    punishment records and statistics follow it at their own pace through :class:`Consumer`s.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.consumers: Dict[str, Consumer] = {}
+
+    def append(self, e: Event) -> Event:
+        e.timestamp = e.timestamp or time.time()
+        cur = self.db.execute(
+            "INSERT INTO events (kind, user, user_name, staff, staff_name, reason, data, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (e.kind.value, e.user.id, e.user.name, e.staff.id if e.staff else None, e.staff.name if e.staff else None,
+             e.reason, json.dumps(e.data), e.timestamp))
+        e.id = cur.lastrowid
+        metrics.incr(f"journal.{e.kind.value}")
+        for consumer in self.consumers.values():
+            consumer.wakeup.set()
+        return e
+
+    def read(self, after: int, limit: int = BATCH) -> List[Event]:
+        rows = self.db.execute("SELECT * FROM events WHERE id > ? ORDER BY id LIMIT ?", (after, limit))
+        return [Event(id=r[0], kind=Kind(r[1]), user=Subject(r[2], r[3]),
+                      staff=Subject(r[4], r[5]) if r[4] is not None else None,
+                      reason=r[6], data=json.loads(r[7]), timestamp=r[8]) for r in rows]
+
+    def checkpoint(self, consumer: str) -> int:
+        row = self.db.execute("SELECT position FROM checkpoints WHERE consumer=?", (consumer,)).fetchone()
+        return row[0] if row else 0
+
+    def save_checkpoint(self, consumer: str, position: int):
+        self.db.execute("INSERT OR REPLACE INTO checkpoints (consumer, position) VALUES (?, ?)", (consumer, position))
+
+    def prune(self, max_age: float) -> int:
+        """
+        Deletes the events older than `max_age` seconds that every consumer with a checkpoint has handled - filter
+        events hold the whole content of the deleted message
+
+        :return: how many events were deleted
+        """
+        cur = self.db.execute("DELETE FROM events WHERE timestamp < ? AND id <= "
+                              "(SELECT COALESCE(MIN(position), 0) FROM checkpoints)", (time.time() - max_age,))
+        if cur.rowcount:
+            metrics.incr("journal.pruned", cur.rowcount)
+        return cur.rowcount
+
+    def subscribe(self, name: str, handler: Callable[[Event], Awaitable[None]],
+                  flush: Callable[[], Awaitable[None]] = None) -> Consumer:
+        """
+        Starts feeding the events `name` hasn't handled yet to `handler`, and every event appended from now on
+
+        :param name: the consumer's checkpoint - a new name starts from the first event
+        :param flush: awaited after each batch, before the checkpoint moves past it
+        """
+        if name in self.consumers:
+            self.consumers[name].close()
+        consumer = self.consumers[name] = Consumer(self, name, handler, flush)
+        return consumer
+
+    async def tally(self, e: Event):
+        """
+        A consumer counting events per day, kind and rule, for :meth:`tallies`
+        """
+        day = datetime.utcfromtimestamp(e.timestamp).strftime("%Y-%m-%d")
+        rule = str(e.data.get("rule") or "")
+        self.db.execute("INSERT INTO tallies (day, kind, rule, count) VALUES (?, ?, ?, 1) "
+                        "ON CONFLICT (day, kind, rule) DO UPDATE SET count = count + 1",
+                        (day, e.kind.value, rule))
+
+    def tallies(self, days: int) -> Dict[Tuple[str, str], int]:
+        """
+        :return: the number of events of each kind and rule over the last `days` days
+        """
+        since = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        rows = self.db.execute("SELECT kind, rule, SUM(count) FROM tallies WHERE day >= ? GROUP BY kind, rule "
+                               "ORDER BY kind, rule", (since,))
+        return {(kind, rule): n for kind, rule, n in rows}
+
+    def unsubscribe(self, name: str):
+        consumer = self.consumers.pop(name, None)
+        if consumer:
+            consumer.close()
+
+
+journal = Journal(os.getenv("KAEDE_JOURNAL", "journal.db"))
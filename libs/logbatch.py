@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+import discord
+
+from libs import metrics
+
+MAX_EMBEDS = 10
+MAX_CHARACTERS = 6000  # across every embed of a message
+
+
+class EmbedBatcher:
+    """
+    Holds the embeds sent to a channel for `window` seconds and sends them together, up to 10 per message, so a
+    burst of log entries takes a few messages instead of one each. A batch goes out as soon as it is full, and
+    batches to a channel are sent in the order they were made.
+
+    Records `{name}.depth`, the embeds waiting when one is added, and `{name}.lag`, the seconds from adding an embed
+    to its message being sent.
+    """
+
+    def __init__(self, name: str, send: Callable[[discord.TextChannel, List[discord.Embed]],
+                                                 Awaitable[discord.Message]], *, window: float = 1.0):
+        """
+        :param name: the name the metrics are recorded under
+        :param send: sends a message with the embeds to the channel - called in batch order, so it should queue the
+            message before returning if it doesn't send it right away
+        :param window: how long the first embed of a batch waits for others
+        """
+        self.name = name
+        self.send = send
+        self.window = window
+        self._batches: Dict[int, Tuple[discord.TextChannel, List[Tuple[discord.Embed, asyncio.Future, float]]]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._unsent: Set[asyncio.Future] = set()
+        self.depth = 0
+
+    def add(self, channel: discord.TextChannel, embed: discord.Embed) -> asyncio.Future:
+        """
+        :return: a future of the message the embed is sent in
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        _, batch = self._batches.get(channel.id, (channel, []))
+        if batch and (len(batch) >= MAX_EMBEDS or sum(len(e) for e, _, _ in batch) + len(embed) > MAX_CHARACTERS):
+            self.flush(channel.id)
+            batch = []
+        if not batch:
+            self._batches[channel.id] = (channel, batch)
+            self._timers[channel.id] = loop.call_later(self.window, self.flush, channel.id)
+        batch.append((embed, future, time.perf_counter()))
+        self._unsent.add(future)
+        self.depth += 1
+        metrics.observe(f"{self.name}.depth", self.depth)
+        if len(batch) >= MAX_EMBEDS:
+            self.flush(channel.id)
+        return future
+
+    def flush(self, channel_id: int):
+        """
+        Sends a channel's pending batch now
+        """
+        timer = self._timers.pop(channel_id, None)
+        if timer:
+            timer.cancel()
+        if channel_id not in self._batches:
+            return
+        channel, batch = self._batches.pop(channel_id)
+        self.depth -= len(batch)
+        metrics.incr(f"{self.name}.messages")
+        metrics.incr(f"{self.name}.embeds", len(batch))
+        sent = asyncio.ensure_future(self.send(channel, [e for e, _, _ in batch]))
+        sent.add_done_callback(lambda f: self._deliver(f, batch))
+
+    def flush_all(self):
+        for channel_id in list(self._batches):
+            self.flush(channel_id)
+
+    async def drain(self):
+        """
+        Waits until every embed added so far has been sent, or failed to
+        """
+        await asyncio.gather(*self._unsent, return_exceptions=True)
+
+    def _deliver(self, sent: asyncio.Future, batch: List[Tuple[discord.Embed, asyncio.Future, float]]):
+        now = time.perf_counter()
+        for _, future, added in batch:
+            metrics.observe(f"{self.name}.lag", now - added)
+            self._unsent.discard(future)
+            if future.done():
+                continue
+            if sent.cancelled():
+                future.cancel()
+            elif sent.exception():
+                future.set_exception(sent.exception())
+            else:
+                future.set_result(sent.result())
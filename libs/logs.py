@@ -0,0 +1,72 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Mapping
+
+DEBUG2 = (logging.DEBUG + logging.INFO) // 2  # logged messages, with their full content
+logging.addLevelName(DEBUG2, "DEBUG2")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line - time, level, logger and message, and the traceback if there is one
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            line["exc"] = record.exc_text
+        return json.dumps(line, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # like the default, but the traceback stays apart from the message for the JSON lines
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _plain.formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = record.exc_info = None
+        return record
+
+
+_plain = logging.Formatter()
+
+
+def setup(c: Mapping) -> logging.handlers.QueueListener:
+    """
+    Sends every log record through a queue to a thread that writes them, so logging never blocks the event loop -
+    to stderr, and to a size-rotated file of JSON lines if `c["file"]` is set
+
+    :param c: the `logging` section of the config
+    """
+    handlers = [logging.StreamHandler(sys.stderr)]
+    handlers[0].setFormatter(logging.Formatter("%(asctime)-15s %(levelname)-7s %(name)s: %(message)s",
+                                               datefmt="%m/%d/%Y %H:%M:%S"))
+    if c.get("file"):
+        file = logging.handlers.RotatingFileHandler(c["file"], maxBytes=int(float(c.get("max_size", 10)) * (1 << 20)),
+                                                    backupCount=int(c.get("backups", 5)), encoding="utf-8")
+        file.setFormatter(JsonFormatter())
+        handlers.append(file)
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(records))
+    root.setLevel(c.get("level", "DEBUG2"))
+    for name, level in (c.get("levels") or {}).items():
+        logging.getLogger(name).setLevel(level)
+    listener = logging.handlers.QueueListener(records, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
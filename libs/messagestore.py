@@ -0,0 +1,177 @@
+import logging
+import mmap
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from datetime import timezone
+from typing import Dict, NamedTuple, Optional
+
+import discord
+
+from libs import metrics
+
+log = logging.getLogger("kaede.msgstore")
+
+MAGIC = b"KAEDEMS1"
+HEADER = struct.Struct("<8sQQQ")  # magic, head, tail, wrap
+RECORD = struct.Struct("<IBQQQdBH")  # length, live, message, channel, author, created, bot, name length
+
+
+class StoredMessage(NamedTuple):
+    id: int
+    channel_id: int
+    author_id: int
+    author_name: str
+    bot: bool
+    created_at: float
+    content: str
+
+    @classmethod
+    def of(cls, message: discord.Message) -> "StoredMessage":
+        return cls(message.id, message.channel.id, message.author.id, str(message.author), message.author.bot,
+                   message.created_at.replace(tzinfo=timezone.utc).timestamp(), message.content)
+
+
+class MessageStore:
+    """
+    The content of recent messages, so deletes and edits of messages discord.py no longer caches (older ones, or
+    anything from before a restart) can still be logged.
+
+    Messages are kept compressed in a ring of `size` bytes, oldest overwritten first, and at most `entries` of them
+    are kept. The ring is a memory mapped file when given a path, which survives restarts, and anonymous memory
+    otherwise. Only the index, message id to offset, is a Python object.
+
+    Records `message_store.hits`, `.misses` and `.evicted`.
+    """
+
+    def __init__(self, path: Optional[str] = None, *, size: int = 16 << 20, entries: int = 200000):
+        self.path = path
+        self.size = size
+        self.entries = entries
+        fresh = True
+        if path:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT)
+            try:
+                fresh = os.fstat(fd).st_size != size  # a resized ring starts over
+                if fresh:
+                    os.ftruncate(fd, size)
+                self.ring = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        else:
+            self.ring = mmap.mmap(-1, size)
+        self._index: Dict[int, int] = {}  # message -> offset of its latest record
+        self._records: "OrderedDict[int, int]" = OrderedDict()  # offset -> message, oldest first
+        self.head = self.tail = self.wrap = HEADER.size
+        if fresh or not self._load():
+            self._reset()
+
+    def put(self, message: discord.Message):
+        self._write(*StoredMessage.of(message))
+
+    def update(self, message_id: int, content: str):
+        """
+        Replaces a stored message's content, after an edit
+        """
+        stored = self.get(message_id)
+        if stored:
+            self._write(*stored[:-1], content)
+
+    def get(self, message_id: int) -> Optional[StoredMessage]:
+        offset = self._index.get(message_id)
+        if offset is None:
+            metrics.incr("message_store.misses")
+            return None
+        metrics.incr("message_store.hits")
+        return self._read(offset)[0]
+
+    def pop(self, message_id: int) -> Optional[StoredMessage]:
+        """
+        Removes a message, once it's deleted
+
+        :return: the message, if it was stored
+        """
+        stored = self.get(message_id)
+        if stored:
+            offset = self._index.pop(message_id)
+            self.ring[offset + 4] = 0  # dead, so it isn't indexed again on load
+        return stored
+
+    def _write(self, message_id: int, channel_id: int, author_id: int, author_name: str, bot: bool,
+               created_at: float, content: str):
+        name = author_name.encode()[:255]
+        payload = zlib.compress(content.encode("utf-8", "surrogatepass"))
+        length = RECORD.size + len(name) + len(payload)
+        if length > self.size - HEADER.size:
+            return
+        if self.head + length > self.size:
+            # whatever is between the head and the end of the ring is older than every record at its start
+            while self._records and next(iter(self._records)) >= self.head:
+                self._evict()
+            self.wrap, self.head = self.head, HEADER.size
+        while self._records and self.head <= next(iter(self._records)) < self.head + length:
+            self._evict()
+        offset = self.head
+        self.ring[offset:offset + length] = RECORD.pack(length, 1, message_id, channel_id, author_id, created_at,
+                                                        bot, len(name)) + name + payload
+        old = self._index.get(message_id)
+        if old is not None:
+            self.ring[old + 4] = 0
+        self._index[message_id] = offset
+        self._records[offset] = message_id
+        self.head += length
+        while len(self._index) > self.entries:
+            self._evict()
+        self.tail = next(iter(self._records))
+        self.ring[:HEADER.size] = HEADER.pack(MAGIC, self.head, self.tail, self.wrap)
+
+    def _evict(self):
+        offset, message_id = self._records.popitem(last=False)
+        if self._index.get(message_id) == offset:
+            del self._index[message_id]
+            metrics.incr("message_store.evicted")
+
+    def _read(self, offset: int):
+        length, live, message_id, channel_id, author_id, created_at, bot, name_length = \
+            RECORD.unpack_from(self.ring, offset)
+        start = offset + RECORD.size
+        name = self.ring[start:start + name_length].decode(errors="replace")
+        content = zlib.decompress(self.ring[start + name_length:offset + length]).decode("utf-8", "surrogatepass")
+        return StoredMessage(message_id, channel_id, author_id, name, bool(bot), created_at, content), length, live
+
+    def _load(self) -> bool:
+        magic, head, tail, wrap = HEADER.unpack_from(self.ring)
+        if magic != MAGIC:
+            return False
+        # oldest first - from the tail to where the ring wrapped, if it's past the head, then on to the head
+        spans = [(tail, head)] if tail < head else [(tail, wrap), (HEADER.size, head)]
+        try:
+            for offset, end in spans:
+                while offset < end:
+                    stored, length, live = self._read(offset)
+                    if length < RECORD.size:
+                        raise ValueError(length)
+                    if live:
+                        self._index[stored.id] = offset
+                    self._records[offset] = stored.id
+                    offset += length
+        except (struct.error, zlib.error, ValueError):
+            log.warning(f"{self.path} is corrupt, starting over")
+            self._index.clear()
+            self._records.clear()
+            return False
+        self.head, self.tail, self.wrap = head, tail, wrap
+        log.info(f"Loaded {len(self._index)} messages from {self.path}")
+        return True
+
+    def _reset(self):
+        self.head = self.tail = self.wrap = HEADER.size
+        self.ring[:HEADER.size] = HEADER.pack(MAGIC, self.head, self.tail, self.wrap)
+
+    def close(self):
+        self.ring.flush()
+        self.ring.close()
+
+    def __len__(self):
+        return len(self._index)
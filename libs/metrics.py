@@ -0,0 +1,61 @@
+from collections import Counter, deque
+from typing import Deque, Dict, Tuple
+
+
+class Histogram:
+    """
+    Count and total of every observation, and a rolling window of the last `size` for percentiles
+    """
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, size: int = 1000):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: the percentile, 0 to 1
+        :return: the percentile of the recent observations, 0 if there are none
+        """
+        if not self.samples:
+            return 0.0
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(len(s) * p))]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+counters: Counter = Counter()
+histograms: Dict[str, Histogram] = {}
+
+
+def incr(name: str, n: int = 1):
+    counters[name] += n
+
+
+def observe(name: str, value: float):
+    h = histograms.get(name)
+    if h is None:
+        h = histograms[name] = Histogram()
+    h.observe(value)
+
+
+def summary() -> Tuple[Dict[str, int], Dict[str, Tuple[int, float, float, float]]]:
+    """
+    :return: the counters, and (count, mean, p50, p99) of each histogram
+    """
+    return dict(counters), {name: (h.count, h.mean, h.percentile(0.5), h.percentile(0.99))
+                            for name, h in histograms.items()}
+
+
+def reset():
+    counters.clear()
+    histograms.clear()
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import time
+from dataclasses import astuple, dataclass, field
+from typing import Dict, Iterator, Optional
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS mutes (
+            user INTEGER PRIMARY KEY,
+            expiry REAL,
+            rule TEXT,
+            staff INTEGER,
+            since REAL NOT NULL
+            );"""
+
+PATH = os.getenv("KAEDE_MUTES", "mutes.db")
+
+
+@dataclass
+class Mute:
+    user: int
+    expiry: Optional[float] = None  # unix time, None until unmuted by hand
+    rule: Optional[str] = None  # the automod rule, for automatic mutes
+    staff: Optional[int] = None  # the staff member, for manual ones
+    since: float = field(default_factory=time.time)
+
+    @property
+    def expired(self) -> bool:
+        return self.expiry is not None and self.expiry <= time.time()
+
+
+class MuteStore:
+    """
+    Who is muted, until when and why, kept in SQLite so it outlives restarts and members leaving. Everything is read
+    into memory when opened; lookups never touch the database.
+    """
+
+    def __init__(self, path: str = PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._mutes: Dict[int, Mute] = {row[0]: Mute(*row) for row in self.db.execute(
+            "SELECT user, expiry, rule, staff, since FROM mutes")}
+
+    @property
+    def seeded(self) -> bool:
+        """
+        Whether the store has been filled from the muted role once, which only has to happen the first time it's used
+        """
+        return self.db.execute("PRAGMA user_version").fetchone()[0] > 0
+
+    def mark_seeded(self):
+        self.db.execute("PRAGMA user_version=1")
+
+    def add(self, mute: Mute):
+        self.db.execute("INSERT OR REPLACE INTO mutes (user, expiry, rule, staff, since) VALUES (?, ?, ?, ?, ?)",
+                        astuple(mute))
+        self._mutes[mute.user] = mute
+
+    def remove(self, user: int) -> Optional[Mute]:
+        """
+        :return: the mute, if the user was muted
+        """
+        mute = self._mutes.pop(user, None)
+        if mute:
+            self.db.execute("DELETE FROM mutes WHERE user=?", (user,))
+        return mute
+
+    def get(self, user: int) -> Optional[Mute]:
+        return self._mutes.get(user)
+
+    def __contains__(self, user: int) -> bool:
+        return user in self._mutes
+
+    def __iter__(self) -> Iterator[Mute]:
+        return iter(list(self._mutes.values()))
+
+    def __len__(self):
+        return len(self._mutes)
+
+    def close(self):
+        self.db.close()
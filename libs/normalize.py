@@ -0,0 +1,70 @@
+import unicodedata
+from typing import Dict, Optional
+
+# characters used to split up words without being visible
+INVISIBLE = "\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e\u200b\u200c\u200d\u200e\u200f" \
+            "\u202a\u202b\u202c\u202d\u202e\u2060\u2061\u2062\u2063\u2064\ufeff"
+
+# lookalikes with no compatibility decomposition to the letter they imitate
+CONFUSABLES = {
+    # cyrillic
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "с": "c",
+    "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i", "ј": "j", "ԁ": "d", "ԛ": "q", "ԝ": "w",
+    "ү": "y", "һ": "h", "ӏ": "l", "ɡ": "g", "ո": "n", "ս": "u",
+    # greek
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t",
+    "υ": "u", "χ": "x", "ω": "w", "ϲ": "c", "ϳ": "j",
+    # latin letters without a decomposition
+    "ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "đ": "d", "ð": "d", "ħ": "h", "ı": "i", "ł": "l", "ŧ": "t",
+    "ƀ": "b", "ɨ": "i", "ʉ": "u", "þ": "p",
+    # small capitals
+    "ᴀ": "a", "ʙ": "b", "ᴄ": "c", "ᴅ": "d", "ᴇ": "e", "ꜰ": "f", "ɢ": "g", "ʜ": "h", "ɪ": "i", "ᴊ": "j",
+    "ᴋ": "k", "ʟ": "l", "ᴍ": "m", "ɴ": "n", "ᴏ": "o", "ᴘ": "p", "ʀ": "r", "ꜱ": "s", "ᴛ": "t", "ᴜ": "u",
+    "ᴠ": "v", "ᴡ": "w", "ʏ": "y", "ᴢ": "z",
+}
+
+LEETSPEAK = {"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "@": "a", "$": "s"}
+
+# blocks scanned for characters that decompose to ascii - latin, fullwidth, mathematical, enclosed, super/subscript
+_RANGES = ((0x00c0, 0x0250), (0x1e00, 0x1f00), (0x2070, 0x20a0), (0x2100, 0x2150), (0x2460, 0x2500),
+           (0xff01, 0xff5f), (0x1d400, 0x1d800), (0x1f130, 0x1f18a))
+
+
+def _fold(c: str) -> Optional[str]:
+    decomposed = "".join(d for d in unicodedata.normalize("NFKD", c) if not unicodedata.combining(d)).lower()
+    if decomposed and decomposed != c and decomposed.isascii() and decomposed.isprintable():
+        return decomposed
+    return None
+
+
+def _build_table(leet: bool) -> Dict[int, Optional[str]]:
+    table: Dict[int, Optional[str]] = {ord(c): c.lower() for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"}
+    for lo, hi in _RANGES:
+        for cp in range(lo, hi):
+            folded = _fold(chr(cp))
+            if folded is not None:
+                table[cp] = folded
+    for c, folded in CONFUSABLES.items():
+        table[ord(c)] = folded
+        if c.upper() != c and len(c.upper()) == 1:
+            table[ord(c.upper())] = folded
+    table.update({ord(c): None for c in INVISIBLE})
+    if leet:
+        table.update({ord(c): folded for c, folded in LEETSPEAK.items()})
+    return table
+
+
+_TABLE = _build_table(leet=False)
+_LEET_TABLE = _build_table(leet=True)
+
+
+def skeleton(text: str, *, leet: bool = False) -> str:
+    """
+    Folds text to a canonical, lowercase skeleton - confusables, diacritics, fullwidth and other compatibility
+    forms are mapped to ascii and invisible characters are dropped, in a single `str.translate` pass
+
+    :param text: the text to fold
+    :param leet: whether to also fold leetspeak digits and symbols (`n1c3` -> `nice`)
+    :return: the skeleton
+    """
+    return text.translate(_LEET_TABLE if leet else _TABLE)
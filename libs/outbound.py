@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+import discord
+
+from libs import metrics
+from libs.logs import DEBUG2
+
+log = logging.getLogger("kaede.outbound")
+
+BULK_DELETE_MAX = 100
+BULK_DELETE_AGE = timedelta(days=14)
+
+_cog: contextvars.ContextVar = contextvars.ContextVar("outbound_cog", default="-")
+_route: contextvars.ContextVar = contextvars.ContextVar("outbound_route", default="-")
+
+
+class Priority(IntEnum):
+    MODERATION = 0
+    LOGGING = 1
+    COSMETIC = 2
+
+
+class _RateLimitCounter(logging.Filter):
+    # discord.py sleeps through 429s itself and only logs them, so they are counted from its log records
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, str) and record.msg.startswith("We are being rate limited"):
+            metrics.incr(f"http.429 {_cog.get()} {_route.get()}")
+        return True
+
+
+class Outbound:
+    """
+    Schedules the bot's REST calls, so moderation goes out before logging, and logging before cosmetic replies.
+
+    Calls are submitted with a route key, the rate limit bucket they would share with other calls (a channel's
+    messages, a member's roles...). At most `per_route` calls of a route are in flight and at most `concurrency`
+    overall; while a route is busy its queued calls wait without holding up calls on other routes. Deletes queued
+    behind a busy channel are coalesced into bulk deletes.
+    """
+
+    def __init__(self, concurrency: int = 8, per_route: int = 1):
+        self.concurrency = concurrency
+        self.per_route = per_route
+        self._seq = itertools.count()
+        self._ready: List[Tuple[int, int, Hashable, str, Callable, asyncio.Future]] = []
+        self._parked: Dict[Hashable, List[Tuple[int, int, Hashable, str, Callable, asyncio.Future]]] = {}
+        self._busy: Dict[Hashable, int] = {}
+        self._running = 0
+        self._deletes: Dict[Tuple[int, int], List[Tuple[discord.Message, asyncio.Future]]] = {}
+
+    def install(self, bot: discord.Client):
+        """
+        Counts every REST call the bot makes, by cog and route, and the 429s they run into
+        """
+        request = bot.http.request
+
+        async def counted(route, **kwargs):
+            name = f"{route.method} {route.path}"
+            _route.set(name)
+            metrics.incr(f"http.calls {_cog.get()} {name}")
+            return await request(route, **kwargs)
+
+        bot.http.request = counted
+        logging.getLogger("discord.http").addFilter(_RateLimitCounter())
+
+    @staticmethod
+    def attribute(cog: str):
+        """
+        Counts the REST calls made from here on in the current task under `cog`
+        """
+        _cog.set(cog)
+
+    def submit(self, call: Callable[[], Awaitable[Any]], route: Hashable, *,
+               priority: Priority = Priority.COSMETIC, cog: str = "-") -> asyncio.Future:
+        """
+        Queues a call
+
+        :param call: makes the coroutine doing the call
+        :param route: the key of the rate limit bucket the call uses
+        :param priority: the call's class
+        :param cog: the name the call is counted under
+        :return: a future of the call's result. Failures are logged, so it doesn't have to be awaited.
+        """
+        future = asyncio.get_event_loop().create_future()
+        future.add_done_callback(_retrieve)
+        heapq.heappush(self._ready, (priority, next(self._seq), route, cog, call, future))
+        metrics.incr(f"outbound.submitted.{Priority(priority).name.lower()}")
+        self._pump()
+        return future
+
+    def _pump(self):
+        while self._running < self.concurrency and self._ready:
+            item = heapq.heappop(self._ready)
+            route = item[2]
+            if self._busy.get(route, 0) >= self.per_route:
+                heapq.heappush(self._parked.setdefault(route, []), item)
+                continue
+            self._busy[route] = self._busy.get(route, 0) + 1
+            self._running += 1
+            asyncio.ensure_future(self._execute(item))
+
+    async def _execute(self, item: Tuple[int, int, Hashable, str, Callable, asyncio.Future]):
+        _, _, route, cog, call, future = item
+        _cog.set(cog)
+        try:
+            result = await call()
+        except Exception as e:  # noqa e722
+            metrics.incr(f"outbound.errors {cog}")
+            # closed DMs and already deleted messages are expected, and left to the caller
+            expected = isinstance(e, discord.HTTPException) and 400 <= e.status < 500
+            log.log(DEBUG2 if expected else logging.WARNING, f"{cog} call on {route} failed: {e!r}")
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._running -= 1
+            self._busy[route] -= 1
+            if not self._busy[route]:
+                del self._busy[route]
+            parked = self._parked.get(route)
+            if parked:
+                heapq.heappush(self._ready, heapq.heappop(parked))
+                if not parked:
+                    del self._parked[route]
+            self._pump()
+
+    def send(self, target: discord.abc.Messageable, *args, priority: Priority = Priority.COSMETIC,
+             cog: str = "-", **kwargs) -> asyncio.Future:
+        """
+        Queues `target.send(*args, **kwargs)`
+        """
+        route = ("dm", target.id) if isinstance(target, (discord.User, discord.Member)) else ("send", target.id)
+        return self.submit(lambda: target.send(*args, **kwargs), route, priority=priority, cog=cog)
+
+    def react(self, message: discord.Message, emoji, *, priority: Priority = Priority.COSMETIC,
+              cog: str = "-") -> asyncio.Future:
+        """
+        Queues `message.add_reaction(emoji)`
+        """
+        return self.submit(lambda: message.add_reaction(emoji), ("react", message.channel.id),
+                           priority=priority, cog=cog)
+
+    def member(self, member: discord.Member, call: Callable[[], Awaitable[Any]], *,
+               priority: Priority = Priority.MODERATION, cog: str = "-") -> asyncio.Future:
+        """
+        Queues a call acting on a member - roles, kicks, bans
+        """
+        return self.submit(call, ("member", member.guild.id), priority=priority, cog=cog)
+
+    def delete(self, message: discord.Message, *, priority: Priority = Priority.MODERATION,
+               cog: str = "-") -> asyncio.Future:
+        """
+        Queues a message's deletion. Deletes in a channel that pile up while one is in flight go out as one bulk
+        delete.
+        """
+        future = asyncio.get_event_loop().create_future()
+        future.add_done_callback(_retrieve)
+        key = (message.channel.id, priority)
+        batch = self._deletes.get(key)
+        if batch is None:
+            batch = self._deletes[key] = []
+            self.submit(lambda: self._flush_deletes(message.channel, key), ("delete", message.channel.id),
+                        priority=priority, cog=cog)
+        batch.append((message, future))
+        return future
+
+    async def _flush_deletes(self, channel: discord.TextChannel, key: Tuple[int, int]):
+        batch = self._deletes.pop(key)
+        if len(batch) > BULK_DELETE_MAX:
+            rest, batch = batch[BULK_DELETE_MAX:], batch[:BULK_DELETE_MAX]
+            self._deletes[key] = rest
+            self.submit(lambda: self._flush_deletes(channel, key), ("delete", channel.id),
+                        priority=key[1], cog=_cog.get())
+        # every future gets settled, whatever the requests raise
+        try:
+            cutoff = datetime.utcnow() - BULK_DELETE_AGE
+            bulk = [(m, f) for m, f in batch if m.created_at > cutoff]
+            single = [(m, f) for m, f in batch if m.created_at <= cutoff]
+            if len(bulk) > 1:
+                try:
+                    await channel.delete_messages([m for m, _ in bulk])
+                except discord.HTTPException:
+                    single += bulk
+                else:
+                    metrics.incr("outbound.bulk_deletes")
+                    metrics.incr("outbound.coalesced_deletes", len(bulk))
+                    for _, f in bulk:
+                        if not f.done():
+                            f.set_result(None)
+            else:
+                single += bulk
+            for m, f in single:
+                try:
+                    await m.delete()
+                except discord.HTTPException as e:
+                    if not f.done():
+                        f.set_exception(e)
+                else:
+                    if not f.done():
+                        f.set_result(None)
+        except Exception as e:
+            for _, f in batch:
+                if not f.done():
+                    f.set_exception(e)
+            raise
+        finally:
+            for _, f in batch:
+                if not f.done():
+                    f.cancel()
+
+    @property
+    def idle(self) -> bool:
+        return not (self._ready or self._parked or self._running)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: the number of calls queued, parked behind a busy route and in flight
+        """
+        return {"queued": len(self._ready), "parked": sum(map(len, self._parked.values())), "running": self._running}
+
+
+def _retrieve(future: asyncio.Future):
+    # failures are logged when they happen - mark them retrieved so unawaited futures don't warn again
+    if not future.cancelled():
+        future.exception()
+
+
+outbound = Outbound()
@@ -0,0 +1,45 @@
+from typing import Mapping
+
+from libs import metrics
+from libs.ratelimit import SlidingWindow
+
+
+class JoinVelocity:
+    """
+    Counts joins over a sliding window. Raid mode starts once `joins` members join within `interval` seconds, and ends
+    when `cooldown` seconds pass without that happening again.
+
+    Records `joins.velocity`, the joins in the window when one is added.
+    """
+
+    def __init__(self, raid: Mapping):
+        self.window = SlidingWindow()
+        self.raiding = False
+        self.last = 0.0
+        self.load(raid)
+
+    def load(self, raid: Mapping):
+        self.joins = int(raid["joins"])
+        self.interval = float(raid["interval"])
+        self.cooldown = float(raid["cooldown"])
+
+    def add(self, now: float) -> bool:
+        """
+        :return: whether the join started raid mode
+        """
+        n = self.window.add(now, 1, self.interval)
+        metrics.observe("joins.velocity", n)
+        if self.joins <= 0 or n < self.joins:
+            return False
+        self.last = now
+        started, self.raiding = not self.raiding, True
+        return started
+
+    def ended(self, now: float) -> bool:
+        """
+        :return: whether raid mode just ended
+        """
+        if self.raiding and now - self.last >= self.cooldown:
+            self.raiding = False
+            return True
+        return False
@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Hashable, List, Mapping, Optional, Set, Tuple
+
+METRICS = ("messages", "mentions", "links", "newlines", "attachments", "emoji")
+SCOPES = ("member", "channel")
+
+
+@dataclass(frozen=True)
+class RateRule:
+    name: str
+    metric: str
+    number: int
+    interval: float
+    scope: str = "member"
+    duration: int = 15
+
+
+class SlidingWindow:
+    """
+    The weighted events of one key in the last `interval` seconds
+    """
+    __slots__ = ("events", "total", "last")
+
+    def __init__(self):
+        self.events: Deque[Tuple[float, int]] = deque()
+        self.total = 0
+        self.last = 0.0
+
+    def add(self, now: float, weight: int, interval: float) -> int:
+        events = self.events
+        cutoff = now - interval
+        while events and events[0][0] <= cutoff:
+            self.total -= events.popleft()[1]
+        events.append((now, weight))
+        self.total += weight
+        self.last = now
+        return self.total
+
+    def clear(self):
+        self.events.clear()
+        self.total = 0
+
+
+class RateEngine:
+    """
+    Sliding-window rate rules over per-message metrics, keyed per member (`member` scope) or per member in a channel
+    (`channel` scope). Windows of keys that have been idle for longer than the rule's interval are evicted, and each
+    rule keeps at most `max_keys` windows.
+    """
+
+    def __init__(self, automod: Mapping = None, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self.rules: List[RateRule] = []
+        self.metrics: Set[str] = set()
+        self._windows: Dict[str, "OrderedDict[Hashable, SlidingWindow]"] = {}
+        self.load(automod or {})
+
+    def load(self, automod: Mapping):
+        """
+        Loads the rules under `automod.rules`, keeping the windows of rules that still exist
+        """
+        duration = int(automod.get("punishment", {}).get("duration", 15))
+        rules = []
+        for name, r in (automod.get("rules") or {}).items():
+            metric = r.get("metric", "messages")
+            scope = r.get("scope", "member")
+            if metric not in METRICS:
+                raise ValueError(f"Unknown automod metric `{metric}` in rule `{name}`")
+            if scope not in SCOPES:
+                raise ValueError(f"Unknown automod scope `{scope}` in rule `{name}`")
+            rules.append(RateRule(name=str(name), metric=metric, number=int(r["number"]),
+                                  interval=float(r["interval"]), scope=scope,
+                                  duration=int(r.get("duration", duration))))
+        self.rules = rules
+        self.metrics = {r.metric for r in rules}
+        self._windows = {r.name: self._windows.get(r.name, OrderedDict()) for r in rules}
+
+    def _evict(self, windows: "OrderedDict[Hashable, SlidingWindow]", rule: RateRule, now: float):
+        while windows:
+            key, window = next(iter(windows.items()))
+            if len(windows) <= self.max_keys and window.last > now - rule.interval:
+                return
+            del windows[key]
+
+    def hit(self, member: int, channel: int, metrics: Mapping[str, int], now: float = None) -> Optional[RateRule]:
+        """
+        Records a message in every rule's window
+
+        :param member: the author's ID
+        :param channel: the channel's ID
+        :param metrics: the message's value for each metric in :attr:`metrics`
+        :param now: the time of the message, defaults to a monotonic clock
+        :return: the first rule whose limit the message broke, or None
+        """
+        now = time.monotonic() if now is None else now
+        broken = None
+        for rule in self.rules:
+            weight = metrics.get(rule.metric, 0)
+            if not weight:
+                continue
+            windows = self._windows[rule.name]
+            key = member if rule.scope == "member" else (member, channel)
+            window = windows.get(key)
+            if window is None:
+                window = windows[key] = SlidingWindow()
+            else:
+                windows.move_to_end(key)
+            if window.add(now, weight, rule.interval) > rule.number:
+                window.clear()
+                broken = broken or rule
+            self._evict(windows, rule, now)
+        return broken
+
+    def __len__(self):
+        return sum(map(len, self._windows.values()))
@@ -0,0 +1,120 @@
+import random
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Mapping
+
+import discord
+
+from libs import utils
+from libs.analysis import MessageAnalysis, analyze
+from libs.config import config
+from libs.outbound import Priority, outbound
+
+KAEDEMOJI = 715315690105733234
+COG = "Responders"
+
+PING_REPLIES = ("I'm alive!", "Hm?", "Yea? :3", ":D", "That's me!")
+
+_screech = re.compile(r"\bs[kc]re+(?:ch)?\b", re.MULTILINE)
+_screech_strip = {ord(c): None for c in "*.+?"}
+
+
+@dataclass
+class Responder:
+    name: str
+    match: Callable[[MessageAnalysis], bool]
+    respond: Callable[[discord.Message], Awaitable[None]]
+    stop: bool = False  # skip the responders after this one, and command processing
+
+
+class Responders:
+    """
+    Kaede's built-in replies to messages, plus any configured under `responders`, compiled into a table once and
+    evaluated in order on each message. Call :meth:`build` once the bot is ready and whenever the config changes.
+    """
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        self.table: List[Responder] = []
+
+    def build(self):
+        bot_id = self.bot.user.id
+        hello = re.compile(rf"^\s*(?:hi|hiya|hi there|hello|hei|hola|hey),?\s*(?:[Kk]aede|<@!{bot_id}>)[!\.]*\s*$",
+                           re.MULTILINE)
+        ping = f"<@!{bot_id}>"
+        kaedemojis = re.compile("|".join(map(re.escape, config()["kaedemojis"]))) if config()["kaedemojis"] \
+            else None
+        kaedemoji = self.bot.get_emoji(KAEDEMOJI)
+        no_table_flip = list(config()["no-table-flip"])
+
+        async def screech(message: discord.Message):
+            outbound.delete(message, priority=Priority.MODERATION, cog=COG)
+            self.bot.get_cog("Scheduler").delete_after(
+                outbound.send(message.channel, "No screeching please.", cog=COG), 30)
+
+        async def pinged(message: discord.Message):
+            outbound.send(message.channel, random.choice(PING_REPLIES), cog=COG)
+
+        async def greet(message: discord.Message):
+            outbound.send(message.channel, random.choice([f"Hi, {message.author.mention} :3",
+                                                          f"Hey, {message.author.display_name}",
+                                                          f"Hi, {message.author.display_name} :3",
+                                                          f"Hey, {message.author.mention}",
+                                                          "Hello :D"]), cog=COG)
+
+        async def react(message: discord.Message):
+            for emoji in (utils.letter_emoji("M"), utils.letter_emoji("E"), "❕", kaedemoji):
+                if emoji:
+                    outbound.react(message, emoji, cog=COG)
+
+        async def unflip(message: discord.Message):
+            outbound.send(message.channel, "┬─┬ ノ( ゜-゜ノ)", cog=COG)
+            if no_table_flip and random.randint(1, 10) == 1:
+                outbound.send(message.channel, random.choice(no_table_flip), cog=COG)
+
+        self.table = [
+            Responder("screech", lambda m: _screech.search(m.lower.translate(_screech_strip)) is not None, screech,
+                      stop=True),
+            Responder("ping", lambda m: m.content == ping, pinged),
+            Responder("hello", lambda m: hello.search(m.lower) is not None, greet, stop=True),
+        ]
+        if kaedemojis:
+            self.table.append(Responder("kaedemojis", lambda m: kaedemojis.search(m.content) is not None, react))
+        self.table.append(Responder("table flip", lambda m: m.content == "(╯°□°）╯︵ ┻━┻", unflip))
+        self.table += [self._configured(r, bot_id) for r in config().get("responders") or []]
+
+    @staticmethod
+    def _configured(r: Mapping, bot_id: int) -> Responder:
+        pattern = re.compile(str(r["pattern"]).replace("{bot_id}", str(bot_id)), re.MULTILINE)
+        replies = [r["reply"]] if isinstance(r.get("reply"), str) else list(r.get("reply") or [])
+        reactions = list(r.get("react") or [])
+        delete = bool(r.get("delete", False))
+
+        async def respond(message: discord.Message):
+            if delete:
+                outbound.delete(message, priority=Priority.MODERATION, cog=COG)
+            if replies:
+                outbound.send(message.channel, random.choice(replies)
+                              .replace("%user.mention%", message.author.mention)
+                              .replace("%user%", str(message.author))
+                              .replace("%guild%", message.guild.name), cog=COG)
+            if not delete:
+                for emoji in reactions:
+                    outbound.react(message, emoji, cog=COG)
+
+        return Responder(str(r["name"]), lambda m: pattern.search(m.lower) is not None, respond,
+                         stop=bool(r.get("stop", False)))
+
+    async def respond(self, message: discord.Message) -> bool:
+        """
+        Runs every responder whose trigger matches the message, in table order
+
+        :return: whether a responder asked to stop, in which case the message isn't processed as a command
+        """
+        msg = analyze(message)
+        for responder in self.table:
+            if responder.match(msg):
+                await responder.respond(message)
+                if responder.stop:
+                    return True
+        return False
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, Optional, Set, Tuple
+
+from libs.filters import FilterEngine
+
+log = logging.getLogger("kaede.filter")
+
+LOAD_TIMEOUT = 30  # seconds a worker gets to compile the rules, apart from the per-message budget
+
+_ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+def _worker_main(conn):
+    logging.disable(logging.INFO)
+    engine = FilterEngine()
+    while True:
+        try:
+            op, *args = conn.recv()
+        except (EOFError, OSError):
+            return
+        if op == "rules":
+            engine = FilterEngine(args[0])
+            conn.send(True)
+        elif op == "check":
+            conn.send(engine.check(*args))
+        elif op == "probe":
+            conn.send(bool(re.search(args[0], args[1])))
+
+
+class _Worker:
+    def __init__(self):
+        self.conn = None
+        self.process = None
+        self.version = -1
+        self.start()
+
+    def start(self):
+        self.conn, child = _ctx.Pipe()
+        self.process = _ctx.Process(target=_worker_main, args=(child,), daemon=True, name="kaede-filter")
+        self.process.start()
+        child.close()
+        self.version = -1
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def call(self, msg: tuple, timeout: float) -> Tuple[bool, object]:
+        """
+        Sends a request to the worker, killing and restarting it if it doesn't answer in time or has died
+
+        :return: a tuple of (answered in time, answer)
+        """
+        try:
+            self.conn.send(msg)
+            if self.conn.poll(timeout):
+                return True, self.conn.recv()
+        except (EOFError, OSError) as e:
+            log.error(f"Filter worker {self.process.pid} died ({self.process.exitcode}), restarting it - {e!r}")
+        self.kill()
+        self.start()
+        return False, None
+
+
+class RegexSandbox:
+    """
+    Evaluates the regex rules of a :class:`FilterEngine` in a small pool of worker processes with a hard time
+    budget per message, so a catastrophically backtracking rule can't block the event loop. Workers that exceed the
+    budget are killed, and the rules responsible are found, quarantined and reported through `on_quarantine`.
+
+    Messages that don't contain any rule's required literals never leave the bot process. A worker loads new rules
+    before its next check and acknowledges them; that load gets `LOAD_TIMEOUT` seconds of its own, outside the
+    budget.
+    """
+
+    def __init__(self, engine: FilterEngine, workers: int = 2, budget: float = 0.25,
+                 on_quarantine: Callable[[str, str], Awaitable[None]] = None):
+        self.engine = engine
+        self.budget = budget
+        self.on_quarantine = on_quarantine
+        self.timeouts = 0
+        self._workers = [_Worker() for _ in range(workers)]
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for w in self._workers:
+            self._idle.put_nowait(w)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kaede-filter")
+        self._hunting = asyncio.Lock()
+
+    def _call(self, worker: _Worker, msg: tuple) -> Tuple[bool, object]:
+        # checks need the current rules, loaded before the budget starts; probes carry their own regex
+        if msg[0] == "check" and worker.version != self.engine.version:
+            version = self.engine.version
+            loaded, _ = worker.call(("rules", self.engine.rules()), LOAD_TIMEOUT)
+            if not loaded:
+                log.error(f"A filter worker took over {LOAD_TIMEOUT}s to load the rules, skipping a message")
+                return True, None
+            worker.version = version
+        return worker.call(msg, self.budget)
+
+    async def _run(self, msg: tuple) -> Tuple[bool, object]:
+        worker = await self._idle.get()
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self._executor, self._call, worker, msg)
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def check(self, text: str, plain: str = None) -> Optional[Tuple[str, str]]:
+        """
+        Checks the text against the word/token rules of the engine
+
+        :param text: the (lowercased) text to check
+        :param plain: the text folded without leetspeak, see :meth:`FilterEngine.check`
+        :return: a tuple of (rule class, pattern) for the rule that fired, or None. Messages that exceed the time
+                 budget are treated as clean.
+        """
+        candidates = self.engine.candidates(text, plain)
+        if not candidates:
+            return None
+        ok, result = await self._run(("check", text, plain))
+        if ok:
+            return result
+        self.timeouts += 1
+        log.warning(f"Filter evaluation exceeded {self.budget}s on a {len(text)} character message")
+        asyncio.ensure_future(self._hunt(text, plain, candidates))
+        return None
+
+    async def _hunt(self, text: str, plain: Optional[str], candidates: Iterable[Tuple[int, int]]):
+        """
+        Re-runs each candidate rule on its own to find the ones that exceed the time budget
+        """
+        async with self._hunting:
+            rule_sets = self.engine.rule_sets
+            suspects: Set[Tuple[str, str, str, str]] = {
+                (rule_sets[s].name, rule_sets[s].patterns[i], rule_sets[s].compiled[i].pattern,
+                 plain if plain is not None and (s, i) in self.engine.plain_rules else text)
+                for s, i in candidates if s < len(rule_sets) and i < len(rule_sets[s])
+            }
+            for name, pattern, regex, subject in sorted(suspects):
+                if pattern in self.engine.quarantined:
+                    continue
+                ok, _ = await self._run(("probe", regex, subject))
+                if ok:
+                    continue
+                log.warning(f"Quarantining {name} rule `{pattern}`")
+                self.engine.quarantine(pattern)
+                if self.on_quarantine:
+                    await self.on_quarantine(name, pattern)
+
+    def close(self):
+        for w in self._workers:
+            w.kill()
+        self._executor.shutdown(wait=False)
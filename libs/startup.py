@@ -0,0 +1,93 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+log = logging.getLogger("kaede.bot")
+
+GUILD_ID = 586199960198971409
+
+started = time.perf_counter()
+loads: List[Tuple[str, float]] = []
+inits: Dict[str, float] = {}
+ready_at: Optional[float] = None
+
+_done: Dict[str, asyncio.Event] = {}
+
+
+def guild(bot: commands.Bot) -> discord.Guild:
+    """
+    :return: the server kaede runs in - looked up on every call, as a fresh READY replaces every guild object
+    """
+    return bot.get_guild(GUILD_ID)
+
+
+def _key(cog: commands.Cog) -> str:
+    # cogs are told apart by module, as two extensions may name their cogs the same
+    return type(cog).__module__
+
+
+def _event(name: str) -> asyncio.Event:
+    event = _done.get(name)
+    if event is None:
+        event = _done[name] = asyncio.Event()
+    return event
+
+
+def load_extensions(bot: commands.Bot, extensions: Iterable[str]):
+    """
+    Loads extensions in order, timing each one's import and setup
+    """
+    for ext in extensions:
+        log.info(f"Loading {ext}")
+        start = time.perf_counter()
+        bot.load_extension(ext)
+        loads.append((ext, time.perf_counter() - start))
+
+
+def init(*after: str) -> Callable[[Callable[..., Awaitable[None]]], Callable[..., Awaitable[None]]]:
+    """
+    Decorates a cog's `_init`, which runs once the bot is ready and the cogs named in `after` have initialized.
+    Cogs without dependencies on each other initialize concurrently.
+
+    :param after: the names of the cogs this one uses during or after initialization
+    """
+
+    def decorator(func: Callable[..., Awaitable[None]]) -> Callable[..., Awaitable[None]]:
+        @functools.wraps(func)
+        async def wrapper(self: commands.Cog):
+            name = _key(self)
+            event = _event(name)
+            try:
+                await self.bot.wait_until_ready()
+                # by now every loaded cog's _init has started and registered its event - cogs without one are
+                # ready as soon as the bot is
+                deps = [_key(cog) for cog in map(self.bot.get_cog, after) if cog is not None]
+                await asyncio.gather(*(_done[dep].wait() for dep in deps if dep in _done))
+                start = time.perf_counter()
+                await func(self)
+                inits[name] = time.perf_counter() - start
+            finally:
+                event.set()
+
+        return wrapper
+
+    return decorator
+
+
+async def report(bot: commands.Bot):
+    """
+    Waits for every cog with a decorated `_init` to finish, then logs how long startup took
+    """
+    global ready_at
+    ready_at = time.perf_counter()
+    await asyncio.gather(*(_event(name).wait() for name in list(_done)))
+    lines = [f"{ext:<40} {t * 1000:>8.1f}ms" for ext, t in loads]
+    lines += [f"{name + ' init':<40} {t * 1000:>8.1f}ms" for name, t in sorted(inits.items(), key=lambda i: -i[1])]
+    lines.append(f"{'ready':<40} {(ready_at - started) * 1000:>8.1f}ms")
+    lines.append(f"{'initialized':<40} {(time.perf_counter() - started) * 1000:>8.1f}ms")
+    log.info("Startup\n" + "\n".join(lines))
@@ -0,0 +1,131 @@
+import json
+import logging
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple
+
+log = logging.getLogger("kaede.store")
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            list TEXT NOT NULL,
+            value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS items_list ON items (list, id);
+            CREATE TABLE IF NOT EXISTS keyvalues (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+            );"""
+
+# config paths copied into the store the first time it is opened - lists, then single values
+IMPORTED_LISTS = {"word_blacklist": ("filters", "word_blacklist"),
+                  "token_blacklist": ("filters", "token_blacklist"),
+                  "statuses": ("statuses",)}
+IMPORTED_VALUES = {"autokick": ("autokick",)}
+
+
+class Store:
+    """
+    The state kaede's commands change at runtime - filter lists, statuses, the autokick threshold - kept in SQLite so
+    a change writes one row instead of the whole config file. Everything is read into memory when opened; reads never
+    touch the database.
+
+    Each list and value has a version, bumped on every write, so whatever is derived from it (compiled matchers,
+    status cycles) can tell whether it needs rebuilding.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # WAL commits without an fsync each
+        self.db.executescript(SCHEMA)
+        self._lists: Dict[str, List[Tuple[int, str]]] = {}
+        for id_, name, value in self.db.execute("SELECT id, list, value FROM items ORDER BY id"):
+            self._lists.setdefault(name, []).append((id_, value))
+        self._values: Dict[str, Any] = {k: json.loads(v) for k, v in self.db.execute("SELECT * FROM keyvalues")}
+        self._versions: Dict[str, int] = {}
+        self.listeners: List[Callable[[str], None]] = []
+
+    def seed(self, c: Mapping):
+        """
+        Copies the runtime lists and values out of the config, the first time the store is opened. From then on the
+        store is what counts, and those config entries are ignored.
+        """
+        if "_imported" in self._values:
+            return
+        with self.db:
+            self.db.execute("BEGIN")
+            for name, path in IMPORTED_LISTS.items():
+                values = _lookup(c, path)
+                if values is not None and name not in self._lists:
+                    self._write_list(name, map(str, values))
+            for name, path in IMPORTED_VALUES.items():
+                value = _lookup(c, path)
+                if value is not None and name not in self._values:
+                    self._write_value(name, value)
+            self._write_value("_imported", True)
+        log.info(f"Imported {', '.join(IMPORTED_LISTS)} and {', '.join(IMPORTED_VALUES)} "
+                 f"from the config into {self.path}")
+
+    def version(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def list(self, name: str) -> Tuple[str, ...]:
+        return tuple(v for _, v in self._lists.get(name, ()))
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self._values.get(name, default)
+
+    def append(self, name: str, value: str):
+        cur = self.db.execute("INSERT INTO items (list, value) VALUES (?, ?)", (name, value))
+        self._lists.setdefault(name, []).append((cur.lastrowid, value))
+        self._changed(name)
+
+    def pop(self, name: str, index: int) -> str:
+        """
+        Removes the item at `index` of a list
+
+        :return: the removed item
+        """
+        id_, value = self._lists[name][index]
+        self.db.execute("DELETE FROM items WHERE id=?", (id_,))
+        del self._lists[name][index]
+        self._changed(name)
+        return value
+
+    def replace(self, name: str, values: Iterable[str]):
+        with self.db:
+            self.db.execute("BEGIN")
+            self._write_list(name, values)
+        self._changed(name)
+
+    def set(self, name: str, value: Any):
+        self._write_value(name, value)
+        self._changed(name)
+
+    def _write_list(self, name: str, values: Iterable[str]):
+        self.db.execute("DELETE FROM items WHERE list=?", (name,))
+        self._lists[name] = []
+        for value in values:
+            cur = self.db.execute("INSERT INTO items (list, value) VALUES (?, ?)", (name, value))
+            self._lists[name].append((cur.lastrowid, value))
+
+    def _write_value(self, name: str, value: Any):
+        self.db.execute("INSERT OR REPLACE INTO keyvalues (key, value) VALUES (?, ?)", (name, json.dumps(value)))
+        self._values[name] = value
+
+    def _changed(self, name: str):
+        self._versions[name] = self.version(name) + 1
+        for listener in self.listeners:
+            listener(name)
+
+    def close(self):
+        self.db.close()
+
+
+def _lookup(c: Mapping, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(c, Mapping) or key not in c:
+            return None
+        c = c[key]
+    return c
@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+from libs import metrics
+
+
+class Suppressions:
+    """
+    The gateway events kaede caused itself and shouldn't log - the deletion of a filtered message, the leave of a
+    member it kicked. The cause is added before the action, and the event handler consumes it when the event arrives.
+
+    Entries expire after `ttl` seconds, for events that never arrive (a delete that failed, a ban of a user who isn't
+    a member), and the oldest are dropped past `size`. Records `suppress.{kind}.hits`, `.misses` and `.expired`.
+    """
+
+    def __init__(self, ttl: float = 300, size: int = 10000):
+        self.ttl = ttl
+        self.size = size
+        self._entries: "OrderedDict[Tuple[str, Hashable], float]" = OrderedDict()  # -> expiry, oldest first
+
+    def add(self, kind: str, key: Hashable):
+        now = time.monotonic()
+        self._expire(now)
+        self._entries[(kind, key)] = now + self.ttl
+        self._entries.move_to_end((kind, key))
+        if len(self._entries) > self.size:
+            (old, _), _ = self._entries.popitem(last=False)
+            metrics.incr(f"suppress.{old}.expired")
+
+    def consume(self, kind: str, key: Hashable) -> bool:
+        """
+        :return: whether the event was suppressed - an entry is only used once
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if self._entries.pop((kind, key), None) is None:
+            metrics.incr(f"suppress.{kind}.misses")
+            return False
+        metrics.incr(f"suppress.{kind}.hits")
+        return True
+
+    def _expire(self, now: float):
+        # every entry has the same ttl, so they expire in the order they were added
+        while self._entries:
+            (kind, key), expiry = next(iter(self._entries.items()))
+            if expiry > now:
+                break
+            del self._entries[(kind, key)]
+            metrics.incr(f"suppress.{kind}.expired")
+
+    def __len__(self):
+        return len(self._entries)
+
+
+suppressions = Suppressions()
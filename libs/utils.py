@@ -5,9 +5,8 @@ from typing import Any, List, Union
 
 import discord
 from discord.ext import commands
-from dateutil import parser
 
-from libs.config import config
+from libs.config import settings
 
 NBSP = "͔"
 
@@ -24,9 +23,31 @@ def quote(st: str):
     return "\n".join(f"> {n}" for n in st.split("\n"))
 
 
+def has_staff_role(member: discord.Member) -> bool:
+    staff = settings().staff_role
+    return any(r.id == staff for r in member.roles)
+
+
+def has_config_role(name: str):
+    """
+    Like `commands.has_role`, but the role is the one named `name` under `roles` in the config at the time the
+    command is invoked, so a reloaded config applies to commands defined before it
+    """
+
+    def predicate(ctx: commands.Context) -> bool:
+        if not isinstance(ctx.channel, discord.abc.GuildChannel):
+            raise commands.NoPrivateMessage()
+        role = settings().roles[name]
+        if not any(r.id == role for r in ctx.author.roles):
+            raise commands.MissingRole(role)
+        return True
+
+    return commands.check(predicate)
+
+
 def is_staff(ctx: commands.Context, user: discord.User):
     member: discord.Member = ctx.guild.get_member(user.id)
-    return config()["roles"]["staff"] in [r.id for r in member.roles]
+    return has_staff_role(member)
 
 
 def trim(st: str, length: int = 300) -> str:
@@ -157,6 +178,8 @@ def str_to_stamp(*date: str):
     :param date: the string that will be converted
     :return: returns the timestamp for the strings
     """
+    from dateutil import parser
+
     all_strings = ""
     for string in date:
         all_strings += f"{string} "
@@ -1,29 +1,28 @@
 import logging
 import os
-import random
-import re
+from typing import FrozenSet
 
 import discord
 import dotenv
 from discord.ext import commands
 
-from libs import utils
+from libs import analysis, logs, startup
 from libs.config import config
+from libs.outbound import outbound
+from libs.responders import Responders
 
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+log = logging.getLogger("kaede.bot")
 
-logging.addLevelName((logging.DEBUG + logging.INFO) // 2, "DEBUG2")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-logging.basicConfig(level=logging.getLevelName("DEBUG2"), format="%(asctime)-15s %(message)s",
-                    datefmt="%m/%d/%Y %H:%M:%S")
+logs.setup(config()["logging"])
 dotenv.load_dotenv()
 
 
 def get_prefix(bot, message):
-    prefixes = config()["prefixes"]
     if not message.guild:
         return '!'
-    return commands.when_mentioned_or(*prefixes)(bot, message)
+    return analysis.prefixes or analysis.load_prefixes(bot)
 
 
 bot = commands.Bot(command_prefix=get_prefix,
@@ -32,8 +31,11 @@ bot = commands.Bot(command_prefix=get_prefix,
                                            members=True,
                                            reactions=True))
 bot.remove_command('help')
+outbound.install(bot)
+responders = Responders(bot)
 
-initial_extensions = ["cogs.search",
+initial_extensions = ["scheduler",
+                      "cogs.search",
                       "cogs.unitedmc",
                       "cogs.administration.protection",
                       "cogs.administration.administration",
@@ -49,45 +51,41 @@ initial_extensions = ["cogs.search",
                       "cogs.help"]
 
 if __name__ == '__main__':
-    for ext in initial_extensions:
-        logging.info(f"[BOT] Loading {ext}")
-        bot.load_extension(ext)
+    startup.load_extensions(bot, initial_extensions)
 
 
 @bot.event
 async def on_ready():
+    analysis.load_prefixes(bot)
+    responders.build()
     await bot.change_presence(status=discord.Status.do_not_disturb, activity=discord.Game(name="Hey there!"))
-    logging.info("[BOT] Kaede online!")
+    log.info("Kaede online!")
+    if startup.ready_at is None:
+        bot.loop.create_task(startup.report(bot))
 
 
 @bot.event
 async def on_message(message: discord.Message):
     if message.author.bot or not message.guild:
         return
-    anti_misfit_regex = r"\bs[kc]re+(?:ch)?\b"
-    if re.findall(anti_misfit_regex, re.sub("[*.+?]", "", message.content.lower()), re.MULTILINE).__len__() != 0:
-        await message.delete()
-        await message.channel.send("No screeching please.", delete_after=30)
-    hello_regex = rf"^\s*(?:hi|hiya|hi there|hello|hei|hola|hey),?\s*(?:[Kk]aede|<@!{str(bot.user.id)}>)[!\.]*\s*$"
-    if message.content == "<@!" + str(bot.user.id) + ">":
-        await message.channel.send(random.choice("I'm alive!,Hm?,Yea? :3,:D,That's me!".split(",")))
-    if re.findall(hello_regex, message.content.lower(), re.MULTILINE).__len__() != 0:
-        await message.channel.send(random.choice(["Hi, " + message.author.mention + " :3",
-                                                  "Hey, " + message.author.display_name,
-                                                  "Hi, " + message.author.display_name + " :3",
-                                                  "Hey, " + message.author.mention,
-                                                  "Hello :D"]))
+    if await responders.respond(message):
         return
-    if any([s in message.content for s in config()["kaedemojis"]]):
-        await message.add_reaction(utils.letter_emoji("M"))
-        await message.add_reaction(utils.letter_emoji("E"))
-        await message.add_reaction("\u2755")
-        await message.add_reaction([e for e in message.guild.emojis if e.id == 715315690105733234][0])
-    if message.content == "(╯°□°）╯︵ ┻━┻":
-        await message.channel.send("┬─┬ ノ( ゜-゜ノ)")
-        if random.randint(1, 10) == 1:
-            await message.channel.send(random.choice(config()["no-table-flip"]))
-    await bot.process_commands(message)
-
-
-bot.run(os.getenv("TOKEN"))
+    if analysis.analyze(message).prefix is not None:
+        await bot.process_commands(message)
+
+
+@bot.before_invoke
+async def attribute_command(ctx: commands.Context):
+    outbound.attribute(ctx.cog.qualified_name if ctx.cog else "-")
+
+
+@bot.listen()
+async def on_config_reload(changed: FrozenSet[str]):
+    if "prefixes" in changed:
+        analysis.load_prefixes(bot)
+    if changed & {"kaedemojis", "no-table-flip", "responders"}:
+        responders.build()
+
+
+if __name__ == '__main__':
+    bot.run(os.getenv("TOKEN"))
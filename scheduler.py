@@ -1,10 +1,161 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import discord
 from discord.ext import commands
 
+from libs import metrics
+from libs.outbound import Priority, outbound
+
+log = logging.getLogger("kaede.scheduler")
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS timers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT UNIQUE,
+            due REAL NOT NULL,
+            action TEXT NOT NULL,
+            data TEXT NOT NULL
+            );"""
+
+PATH = os.getenv("KAEDE_SCHEDULER", "scheduler.db")
+
 
 class Scheduler(commands.Cog):
-    def __init__(self, bot: commands.Bot):
+    """
+    Runs actions later - unmutes, unsilences, deleting replies - and keeps them across restarts.
+
+    Each timer is a row in SQLite and a (due, id) entry in one heap, which a single task sleeps on until the earliest
+    is due, so pending timers cost no tasks. Timers that came due while the bot was down run once it's ready. An
+    action runs once its cog has registered a handler for it with :meth:`register`; a timer is only removed after its
+    handler returns, so it runs at least once.
+
+    Records `scheduler.lateness`, the seconds between a timer being due and running, and `scheduler.errors`.
+    """
+
+    def __init__(self, bot: commands.Bot, path: str = PATH):
         self.bot = bot
-        self.tasks = []
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._timers: Dict[int, Tuple[float, str, Optional[str], Dict[str, Any]]] = {}  # -> due, action, key, data
+        self._keys: Dict[str, int] = {}
+        self._parked: Dict[str, List[int]] = {}  # due, but nothing handles the action yet
+        for id_, key, due, action, data in self.db.execute("SELECT id, key, due, action, data FROM timers"):
+            self._add(id_, due, action, key, json.loads(data))
+        self._wakeup = asyncio.Event()
+        self.register("delete", self._delete)
+        self.task = bot.loop.create_task(self._run())
+
+    def cog_unload(self):
+        self.task.cancel()
+        self.db.close()
+
+    def register(self, action: str, handler: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """
+        Sets the coroutine run with the data of each timer of `action` once it's due
+        """
+        self.handlers[action] = handler
+        for id_ in self._parked.pop(action, []):
+            heapq.heappush(self._heap, (self._timers[id_][0], id_))
+        self._wakeup.set()
+
+    def schedule(self, action: str, delay: float, *, key: str = None, **data) -> int:
+        """
+        Runs `action` in `delay` seconds
+
+        :param key: names the timer, to cancel it - a timer with the same key is replaced
+        :param data: passed to the handler, must be JSON serializable
+        :return: the timer's id
+        """
+        if key is not None:
+            self.cancel(key)
+        due = time.time() + delay
+        cur = self.db.execute("INSERT INTO timers (key, due, action, data) VALUES (?, ?, ?, ?)",
+                              (key, due, action, json.dumps(data)))
+        self._add(cur.lastrowid, due, action, key, data)
+        if self._heap[0][1] == cur.lastrowid:
+            self._wakeup.set()
+        return cur.lastrowid
+
+    def cancel(self, key: str) -> bool:
+        """
+        :return: whether there was a timer with that key
+        """
+        id_ = self._keys.get(key)
+        if id_ is None:
+            return False
+        self._remove(id_)
+        return True
+
+    def delete_after(self, message: Union[discord.Message, asyncio.Future], delay: float):
+        """
+        Deletes a message in `delay` seconds, like `delete_after`, or the message a future of one results in
+        """
+        if isinstance(message, asyncio.Future):
+            message.add_done_callback(
+                lambda f: f.cancelled() or f.exception() or self.delete_after(f.result(), delay))
+            return
+        self.schedule("delete", delay, channel=message.channel.id, message=message.id)
+
+    def _add(self, id_: int, due: float, action: str, key: Optional[str], data: Dict[str, Any]):
+        self._timers[id_] = (due, action, key, data)
+        if key is not None:
+            self._keys[key] = id_
+        heapq.heappush(self._heap, (due, id_))
+
+    def _remove(self, id_: int):
+        # its heap entry is skipped when it comes up
+        _, _, key, _ = self._timers.pop(id_)
+        if key is not None:
+            del self._keys[key]
+        self.db.execute("DELETE FROM timers WHERE id=?", (id_,))
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, id_ = heapq.heappop(self._heap)
+                timer = self._timers.get(id_)
+                if timer is None:
+                    continue
+                if timer[1] not in self.handlers:
+                    self._parked.setdefault(timer[1], []).append(id_)
+                    continue
+                metrics.observe("scheduler.lateness", now - due)
+                asyncio.ensure_future(self._fire(id_, *timer))
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, id_: int, due: float, action: str, key: Optional[str], data: Dict[str, Any]):
+        try:
+            await self.handlers[action](data)
+        except Exception:  # noqa e722
+            metrics.incr("scheduler.errors")
+            log.exception(f"{action} timer {id_} failed")
+        finally:
+            if self._timers.get(id_, (None,))[0] == due:
+                self._remove(id_)
+
+    async def _delete(self, data: Dict[str, Any]):
+        try:
+            await outbound.submit(lambda: self.bot.http.delete_message(data["channel"], data["message"]),
+                                  ("delete", data["channel"]), priority=Priority.COSMETIC, cog=self.qualified_name)
+        except discord.NotFound:
+            pass
 
 
 def setup(bot: commands.Bot) -> None: